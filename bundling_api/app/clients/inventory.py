@@ -1,22 +1,84 @@
-from typing import List, Dict
-from sqlalchemy import text
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterator, Any, Optional
+from sqlalchemy import text, bindparam, String, Integer
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import OperationalError
 from fastapi import HTTPException
 
+from ..utils.dates import parse_expiry
 
-def fetch_products_for_store(db: Session, store_id: str) -> List[Dict]:
-    q = text(
+# Rows are pulled from the driver in batches of this size instead of all at once
+FETCH_BATCH_SIZE = 1000
+
+
+@dataclass(slots=True, frozen=True)
+class InventoryProduct:
+    """An active product row, with the numeric columns already coerced (NULL -> 0) and
+    expiresOn parsed (missing, infinite or unparseable -> FAR_FUTURE)."""
+    id: str
+    name: Optional[str]
+    product_type: Optional[str]
+    expires_on: datetime
+    stock: int
+    tags: Any  # raw tags column: JSON array text, comma-separated text, or NULL
+    price: float
+    original_price: float
+
+# Stand-in expiry for products without a usable expiresOn, so they sort after expiring ones
+FAR_FUTURE = datetime(9999, 1, 1, tzinfo=timezone.utc)
+
+
+def _parse_expiry(value) -> datetime:
+    dt = value if isinstance(value, datetime) else parse_expiry(value)
+    if dt is None or dt.year < 1900:
+        return FAR_FUTURE
+    return dt
+
+
+# Built once at import so the statement (and its compiled form) is reused across requests.
+# The predicate matches idx_products_active_cover (migration 0006), which also carries
+# every selected column except name and tags (too large to index; read from the heap); keep
+# them in sync. "expiresOn" defaults to -infinity, which psycopg cannot load as a datetime,
+# so infinite values come back as NULL.
+_FETCH_PRODUCTS_STMT = (
+    text(
         """
-        SELECT id, name, "productType", "expiresOn", stock, tags, price, "originalPrice", "productCost"
+        SELECT id, name, "productType",
+               CASE WHEN isfinite("expiresOn") THEN "expiresOn" END AS "expiresOn",
+               stock, tags, price, "originalPrice"
         FROM products
-        WHERE "storeId" = :store_id AND ("isActive" = true OR "isActive" IS NULL)
+        WHERE "storeId" = :store_id AND "isActive" IS NOT FALSE
         """)
+    .bindparams(bindparam("store_id", type_=String()))
+    .columns(id=String(), name=String(), productType=String(), stock=Integer(), tags=String())
+    .execution_options(yield_per=FETCH_BATCH_SIZE)
+)
+
+
+def fetch_products_for_store(db: Session, store_id: str) -> Iterator[InventoryProduct]:
+    """Stream the active products of a store as InventoryProduct records.
+
+    Rows are fetched lazily in batches of FETCH_BATCH_SIZE, so callers can start
+    working before the whole result set is loaded.
+    """
     try:
-        res = db.execute(q, {"store_id": store_id})
+        res = db.execute(_FETCH_PRODUCTS_STMT, {"store_id": store_id})
     except OperationalError:
         raise HTTPException(status_code=503, detail="Database unavailable")
-    out: List[Dict] = []
-    for row in res.mappings():
-        out.append(dict(row))
-    return out
+    return _iter_products(res)
+
+
+def _iter_products(res) -> Iterator[InventoryProduct]:
+    for partition in res.partitions():
+        for id_, name, product_type, expires_on, stock, tags, price, original_price in partition:
+            yield InventoryProduct(
+                id=str(id_),
+                name=name,
+                product_type=product_type,
+                expires_on=_parse_expiry(expires_on),
+                stock=int(stock or 0),
+                tags=tags,
+                price=float(price or 0.0),
+                original_price=float(original_price or 0.0),
+            )
@@ -1,5 +1,6 @@
+from functools import cached_property, lru_cache
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from pydantic import Field
+from pydantic import Field, field_validator
 import os
 
 
@@ -13,6 +14,18 @@ class Settings(BaseSettings):
 
     # DB tuning
     db_connect_timeout: int = Field(default=10, alias="DB_CONNECT_TIMEOUT")
+    db_query_cache_size: int = Field(default=500, alias="DB_QUERY_CACHE_SIZE")  # compiled-statement LRU per engine
+    db_pool_size: int = Field(default=20, alias="DB_POOL_SIZE")
+    db_max_overflow: int = Field(default=40, alias="DB_MAX_OVERFLOW")
+    db_pool_timeout: int = Field(default=5, alias="DB_POOL_TIMEOUT")
+    db_pool_recycle: int = Field(default=1800, alias="DB_POOL_RECYCLE")
+    # Set when connecting through PgBouncer in transaction mode: PgBouncer owns the pooling,
+    # so the app opens a connection per checkout and disables server-side prepared statements
+    db_pgbouncer: bool = Field(default=False, alias="DB_PGBOUNCER")
+    # Seconds a store's bundle list/count stays cached in-process; 0 disables
+    bundle_cache_ttl: int = Field(default=30, alias="BUNDLE_CACHE_TTL")
+    # Worker threads for blocking work (DB sessions, uploads); sized to the connection pool by default
+    threadpool_size: int = Field(default=60, alias="THREADPOOL_SIZE")
 
     # AI settings
     ai_provider: str | None = Field(default=None, alias="AI_PROVIDER")  # "openrouter" or "groq"
@@ -20,10 +33,49 @@ class Settings(BaseSettings):
     openrouter_model: str | None = Field(default=None, alias="OPENROUTER_MODEL")
     groq_api_key: str | None = Field(default=None, alias="GROQ_API_KEY")
     groq_model: str | None = Field(default=None, alias="GROQ_MODEL")
+    # Seconds LLM bundle suggestions are reused for an unchanged catalog; 0 disables
+    ai_suggestion_cache_ttl: int = Field(default=300, alias="AI_SUGGESTION_CACHE_TTL")
     
     # Local Image Generation settings (via cloudflared tunnel)
     local_image_api_url: str = Field(default="https://image.huggle.tech", alias="LOCAL_IMAGE_API_URL")
     image_generation_timeout: int = Field(default=180, alias="IMAGE_GENERATION_TIMEOUT")
+    # Default cap on bundle images generated at once in batch requests. The work is waiting on
+    # the image server, so this is about not flooding it rather than saving local CPU
+    image_concurrency: int = Field(default=32, alias="IMAGE_CONCURRENCY")
+    # Seconds a generated image URL is reused for an identical prompt; 0 disables
+    image_prompt_cache_ttl: int = Field(default=3600, alias="IMAGE_PROMPT_CACHE_TTL")
+    # Number of proxied PNGs kept in memory by /images/generated (0 disables)
+    image_cache_size: int = Field(default=128, alias="IMAGE_CACHE_SIZE")
+    # Total bytes of PNGs that cache may hold per worker (0 disables)
+    image_cache_max_bytes: int = Field(default=64 * 1024 * 1024, alias="IMAGE_CACHE_MAX_BYTES")
+    # Hugging Face tokenizer used to cut image prompts to CLIP's limit exactly (needs transformers);
+    # empty uses the word-based estimate
+    clip_tokenizer: str = Field(default="openai/clip-vit-large-patch14", alias="CLIP_TOKENIZER")
 
+    @field_validator("database_url")
+    @classmethod
+    def _use_psycopg3(cls, v: str) -> str:
+        # Bare postgres:// URLs (as copied from Neon/Heroku) would select psycopg2; pin psycopg 3
+        for prefix in ("postgres://", "postgresql://"):
+            if v.startswith(prefix):
+                return "postgresql+psycopg://" + v[len(prefix):]
+        return v
+
+    @cached_property
+    def cors_origin_list(self) -> tuple[str, ...]:
+        """CORS_ORIGINS split on commas, computed once; falls back to ("*",)."""
+        return tuple(o.strip() for o in (self.cors_origins or "").split(",") if o.strip()) or ("*",)
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the process-wide Settings, reading .env and the environment on first use only."""
+    return Settings()
+
+
+def __getattr__(name: str):
+    # Keep `from app.config import settings` working without building Settings at import time
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-settings = Settings()
@@ -1,23 +1,86 @@
+import threading
+from contextvars import ContextVar
+from typing import Optional
+
+import orjson
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from .config import settings
+from sqlalchemy.orm import Session, sessionmaker, scoped_session, declarative_base
+from sqlalchemy.pool import NullPool
+from .config import get_settings
+
+
+settings = get_settings()
+
+
+def _engine_kwargs() -> dict:
+    connect_args = {"connect_timeout": settings.db_connect_timeout, "application_name": "bundling_api"}
+    if settings.db_pgbouncer:
+        # Transaction-mode PgBouncer can hand each transaction a different server connection,
+        # so neither a client-side pool nor psycopg's prepared statements are safe here.
+        connect_args["prepare_threshold"] = None
+        return {"poolclass": NullPool, "connect_args": connect_args}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": True,
+        "connect_args": connect_args,
+    }
+
 
 engine = create_engine(
     settings.database_url,
-    pool_pre_ping=True,
-    pool_recycle=300,
-    connect_args={"connect_timeout": settings.db_connect_timeout},
+    query_cache_size=settings.db_query_cache_size,
+    # psycopg 3 decodes JSONB (Bundle.products/images) itself; have it use orjson instead of json.loads
+    json_deserializer=orjson.loads,
     future=True,
+    **_engine_kwargs(),
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)
+# expire_on_commit=False: async handlers read ORM attributes on the event loop after
+# commit, which must not trigger a lazy (blocking) refresh.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine, future=True)
+
+# One Session per HTTP request. Handlers hop between the event loop and threadpool
+# threads, so the scope is a per-request context variable (copied into every
+# run_in_threadpool call) rather than the thread; outside a request it falls back
+# to the current thread like a plain scoped_session.
+_request_scope: ContextVar[Optional[object]] = ContextVar("db_request_scope", default=None)
+
+
+def _session_scope():
+    return _request_scope.get() or threading.get_ident()
+
+
+ScopedSession = scoped_session(SessionLocal, scopefunc=_session_scope)
 
 Base = declarative_base()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+async def get_db() -> Session:
+    # Plain async dependency: no generator teardown and no threadpool hop just to
+    # build the session. SessionScopeMiddleware closes it when the request ends.
+    return ScopedSession()
+
+
+class SessionScopeMiddleware:
+    """ASGI middleware that opens a session scope per HTTP request and removes it afterwards."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _request_scope.set(object())
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # close() can return a connection to the pool (a rollback round-trip), so it runs
+            # in the threadpool, but only for requests that actually created a session
+            if ScopedSession.registry.has():
+                await run_in_threadpool(ScopedSession.remove)
+            _request_scope.reset(token)
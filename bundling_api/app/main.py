@@ -1,22 +1,58 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import anyio.to_thread
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 
-from .config import settings
+from .config import get_settings
+from .db import SessionScopeMiddleware
 from .routers.bundles import router as bundles_router
-from .routers.images import router as images_router
+from .routers.images import router as images_router, close_image_client
+from .services.ai import close_ai_client
+from .services.image_generator import close_image_api_client, get_clip_tokenizer
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # All DB access goes through run_in_threadpool, so AnyIO's default of 40 threads would
+    # cap concurrent queries below the connection pool (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    threadpool_size = get_settings().threadpool_size
+    anyio.to_thread.current_default_thread_limiter().total_tokens = threadpool_size
+    # asyncio.to_thread (R2 uploads, the image services' DB calls) uses the loop's default
+    # executor instead, which otherwise tops out at min(32, cpu_count + 4) threads
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=threadpool_size, thread_name_prefix="to_thread"))
+    # Load the CLIP tokenizer (if configured) now rather than on the first image request
+    await anyio.to_thread.run_sync(get_clip_tokenizer)
+    yield
+    await close_image_client()
+    await close_ai_client()
+    await close_image_api_client()
 
-app = FastAPI(title="Bundling API", version="0.1.0")
+
+app = FastAPI(title="Bundling API", version="0.1.0", default_response_class=ORJSONResponse, lifespan=lifespan)
+
+# One DB session per request, closed once the response is sent
+app.add_middleware(SessionScopeMiddleware)
 
 # CORS
-origins = [o.strip() for o in (settings.cors_origins or "").split(",") if o.strip()] or ["*"]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=origins,
+    allow_origins=get_settings().cors_origin_list,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let browser clients read the pagination total from GET /bundles
+    expose_headers=["X-Total-Count"],
 )
 
+# Compress larger JSON bodies (bundle lists with products); small responses and PNGs are sent as-is
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
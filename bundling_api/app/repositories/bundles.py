@@ -1,32 +1,44 @@
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
-from typing import List, Optional
-import uuid
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from pydantic import TypeAdapter
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
+from ..config import get_settings
 from ..models.bundle import Bundle
-from ..schemas.bundle import BundleCreate
-from ..utils.signatures import compute_bundle_signature
+from ..schemas.bundle import BundleCreate, ProductIn
+from ..utils.signatures import compute_signature_from_products
 from ..services.pricing import calculate_bundle_pricing
+from ..utils.cache import TTLCache
+from ..utils.ids import uuid7_batch
 
 logger = logging.getLogger(__name__)
 
+# Read-through cache for per-store listings and counts, keyed by (store_id, ...).
+# Writes below invalidate the affected store after they commit.
+bundle_cache = TTLCache(ttl=get_settings().bundle_cache_ttl)
+
+# Dumps a whole product list in one call to the compiled serializer
+_PRODUCTS_ADAPTER = TypeAdapter(List[ProductIn])
+
+
+def _bundle_signature(data: BundleCreate) -> str:
+    """Compute the deduplication signature straight from the product ids.
 
-def create_bundle(db: Session, data: BundleCreate) -> Bundle:
-    """Create a new bundle with automatic signature computation and pricing calculation.
-    
     Raises:
-        ValueError: If a bundle with the same products already exists in this store
         ValueError: If no valid products are provided for signature computation
     """
-    products_data = [p.model_dump(mode="json") for p in data.products]
-    
-    # Compute signature for deduplication
     try:
-        signature = compute_bundle_signature(products_data)
+        return compute_signature_from_products(data.products)
     except ValueError as e:
         raise ValueError(f"Cannot create bundle: {str(e)}")
+
+
+def _bundle_values(data: BundleCreate, bundle_id: str, signature: str) -> dict:
+    """Compute the column values (pricing, defaults) for a new bundle row."""
+    products_data = _PRODUCTS_ADAPTER.dump_python(data.products, mode="json")
     
     # Calculate pricing information
     pricing_info = {}
@@ -51,8 +63,9 @@ def create_bundle(db: Session, data: BundleCreate) -> Bundle:
             'total_cost': total_price,
         }
     
-    bundle = Bundle(
-        id=str(uuid.uuid4()),
+    now = datetime.now(timezone.utc)
+    return dict(
+        id=bundle_id,
         store_id=data.store_id or "",
         signature=signature,
         name=data.name,
@@ -67,40 +80,176 @@ def create_bundle(db: Session, data: BundleCreate) -> Bundle:
         is_dynamic_pricing_enabled=False,
         dynamic_pricing_start_days=14,
         is_active=True,
-        expires_on=datetime.utcnow() + timedelta(days=30),
+        expires_on=now + timedelta(days=30),
+        # Set client-side so a fresh row doesn't need a refresh to read its server defaults
+        created_at=now,
+        updated_at=now,
     )
+
+
+def create_bundle(db: Session, data: BundleCreate, refresh: bool = False) -> Bundle:
+    """Create a new bundle with automatic signature computation and pricing calculation.
+    
+    The row is written with INSERT ... ON CONFLICT DO NOTHING RETURNING, so a duplicate
+    product set comes back as "no row" instead of aborting the transaction with an
+    IntegrityError. All columns are populated client-side, so the row is not re-read
+    after the commit unless ``refresh`` is set.
+    
+    Raises:
+        ValueError: If a bundle with the same products already exists in this store
+        ValueError: If no valid products are provided for signature computation
+    """
+    saved = create_bundles_bulk(db, [data])
+    if not saved:
+        raise ValueError(
+            f"A bundle with the same products already exists in store {data.store_id}"
+        )
+    bundle = saved[0]
+    if refresh:
+        db.refresh(bundle)
+    return bundle
+
+
+def create_bundles_bulk(db: Session, data_list: List[BundleCreate]) -> List[Bundle]:
+    """Insert several bundles in one INSERT ... ON CONFLICT DO NOTHING RETURNING statement.
+    
+    Bundles whose product set already exists in their store (or repeats an earlier
+    entry of the same batch) are skipped rather than raising, so the result may be
+    shorter than the input. Returned bundles keep the input order.
+    
+    Raises:
+        ValueError: If any entry has no valid products for signature computation
+    """
+    rows: List[dict] = []
+    seen: set[tuple[str, str]] = set()
+    # Time-ordered ids for the whole batch from one urandom read
+    for data, bundle_id in zip(data_list, uuid7_batch(len(data_list))):
+        signature = _bundle_signature(data)
+        key = (data.store_id or "", signature)
+        if key in seen:
+            # Skip in-batch repeats before paying for the product dump and pricing
+            continue
+        seen.add(key)
+        rows.append(_bundle_values(data, bundle_id, signature))
+    
+    if not rows:
+        return []
     
+    stmt = (
+        pg_insert(Bundle)
+        .on_conflict_do_nothing(constraint="uq_bundle_store_signature")
+        .returning(Bundle)
+    )
     try:
-        db.add(bundle)
+        inserted = {b.id: b for b in db.scalars(stmt, rows)}
         db.commit()
-        db.refresh(bundle)
-        return bundle
-    except IntegrityError as e:
+    except Exception:
         db.rollback()
-        # Check if this is a duplicate bundle error
-        if 'uq_bundle_store_signature' in str(e.orig):
-            raise ValueError(
-                f"A bundle with the same products already exists in store {data.store_id}"
-            )
-        # Re-raise other integrity errors
         raise
+    for store_id in {store_id for store_id, _ in seen}:
+        bundle_cache.invalidate(store_id)
+    
+    if len(inserted) < len(rows):
+        logger.info(f"Skipped {len(rows) - len(inserted)} duplicate bundle(s) during bulk insert")
+    # RETURNING order isn't guaranteed once conflicting rows drop out; ids are ours, so reorder by them
+    return [inserted[r["id"]] for r in rows if r["id"] in inserted]
 
 
 def get_bundle(db: Session, bundle_id: str) -> Optional[Bundle]:
-    return db.query(Bundle).filter(Bundle.id == bundle_id).first()
+    # Session.get checks the identity map first, so a bundle already loaded in this request costs no query
+    return db.get(Bundle, bundle_id)
 
 
-def list_bundles_by_store(db: Session, store_id: str, limit: int = 50, offset: int = 0) -> List[Bundle]:
-    return (
-        db.query(Bundle)
-        .filter(Bundle.store_id == store_id)
+# Columns needed for list views; leaves out the products JSONB, usually most of the row
+_LIST_COLUMNS = (
+    Bundle.id,
+    Bundle.name,
+    Bundle.description,
+    Bundle.images,
+    Bundle.image_url,
+    Bundle.stock,
+    Bundle.price,
+    Bundle.original_price,
+    Bundle.total_cost,
+    Bundle.created_at,
+)
+
+
+def _page_total(db: Session, store_id: str, rows, offset: int) -> int:
+    # The window count rides along on every row; an empty page past the end has none to read
+    if rows:
+        return rows[0].total
+    return count_bundles_by_store(db, store_id) if offset else 0
+
+
+def list_bundles_by_store(
+    db: Session, store_id: str, limit: int = 50, offset: int = 0
+) -> Tuple[List[Bundle], int]:
+    """Return one page of a store's bundles (newest first) and the store's total bundle count.
+    
+    The total comes from COUNT(*) OVER () on the page query itself, so a paginated
+    view costs one round-trip instead of a page query plus a COUNT.
+    """
+    stmt = (
+        select(Bundle, func.count().over().label("total"))
+        .where(Bundle.store_id == store_id)
+        .order_by(Bundle.created_at.desc())
+        .offset(offset)
+        .limit(limit)
+    )
+    rows = db.execute(stmt).all()
+    return [row[0] for row in rows], _page_total(db, store_id, rows, offset)
+
+
+def list_bundle_summaries_by_store(
+    db: Session, store_id: str, limit: int = 50, offset: int = 0
+) -> Tuple[List[Mapping[str, Any]], int]:
+    """Like list_bundles_by_store, but selects only the summary columns (no products) as row mappings."""
+    stmt = (
+        select(*_LIST_COLUMNS, func.count().over().label("total"))
+        .where(Bundle.store_id == store_id)
         .order_by(Bundle.created_at.desc())
         .offset(offset)
         .limit(limit)
+    )
+    rows = db.execute(stmt).all()
+    return [row._mapping for row in rows], _page_total(db, store_id, rows, offset)
+
+
+def list_bundles_without_image(db: Session, store_id: str, limit: int = 10) -> List[Bundle]:
+    """List bundles in a store that don't have a generated image yet."""
+    return (
+        db.query(Bundle)
+        .filter(Bundle.store_id == store_id, Bundle.image_url.is_(None))
+        .limit(limit)
         .all()
     )
 
 
+def update_bundle_image_urls(db: Session, image_urls: Dict[str, Optional[str]]) -> int:
+    """Set image_url on many bundles at once and commit.
+    
+    Entries without a URL are ignored. The ids already identify the rows, so this is a
+    single executemany UPDATE by primary key (psycopg 3 sends it in pipeline mode)
+    rather than a SELECT + UPDATE per bundle.
+    
+    Returns:
+        Number of bundles that were given an image URL
+    """
+    params = [{"id": bundle_id, "image_url": url} for bundle_id, url in image_urls.items() if url]
+    if not params:
+        return 0
+    try:
+        db.execute(update(Bundle), params)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    # Only ids are known here, so drop every store's entries
+    bundle_cache.invalidate()
+    return len(params)
+
+
 def bundle_exists_for_products(db: Session, store_id: str, product_ids: List[str]) -> bool:
     """Check if a bundle already exists for the given product IDs in a store.
     
@@ -127,6 +276,20 @@ def bundle_exists_for_products(db: Session, store_id: str, product_ids: List[str
         return False
 
 
+def existing_bundle_signatures(db: Session, store_id: str) -> set[str]:
+    """Return the signatures of every bundle in a store, for in-memory duplicate checks.
+    
+    One indexed query (served from uq_bundle_store_signature) replaces a
+    bundle_exists_for_products round-trip per candidate.
+    """
+    return set(db.scalars(select(Bundle.signature).where(Bundle.store_id == store_id)))
+
+
 def count_bundles_by_store(db: Session, store_id: str) -> int:
-    """Count the total number of bundles for a store."""
-    return db.query(Bundle).filter(Bundle.store_id == store_id).count()
+    """Count the total number of bundles for a store (cached for BUNDLE_CACHE_TTL seconds)."""
+    key = (store_id, "count")
+    count = bundle_cache.get(key)
+    if count is None:
+        count = db.query(Bundle).filter(Bundle.store_id == store_id).count()
+        bundle_cache.set(key, count)
+    return count
@@ -1,129 +1,147 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import Response
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 
 from ..db import get_db, engine
-from ..schemas.bundle import BundleOut, BundleCreate, RecommendRequest, AIRecommendRequest
-from ..repositories.bundles import create_bundle, get_bundle, list_bundles_by_store
+from ..schemas.bundle import BundleOut, BundleListItem, BundleCreate, RecommendRequest, AIRecommendRequest
+from ..repositories.bundles import (
+    bundle_cache,
+    create_bundle,
+    create_bundles_bulk,
+    get_bundle,
+    list_bundle_summaries_by_store,
+    list_bundles_by_store,
+    list_bundles_without_image,
+    update_bundle_image_urls,
+)
 from ..services.recommender import recommend_bundles
-from ..services.ai import generate_bundles_for_store
+from ..services.ai import forget_bundle_suggestions, generate_bundles_for_store
+from ..services.database_image_storage import get_bundle_image_meta, get_image_data
 from ..services.image_generator import (
     generate_and_update_bundle_image, 
-    generate_images_for_bundles, 
+    generate_images_for_bundles_async,
     ImageGenerationError
 )
-from ..models.bundle import Bundle
 
 router = APIRouter()
 
+# Serializers for responses built from models that are already validated. Returning those
+# models through response_model would make FastAPI dump and re-validate every one of them.
+_BUNDLES_OUT = TypeAdapter(List[BundleOut])
+_BUNDLE_LIST_ITEMS = TypeAdapter(List[BundleListItem])
+
+
+def _json_response(body: bytes, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# Handlers are async; the Session and the sync services built on it are blocking,
+# so every call that touches them is dispatched to the threadpool explicitly.
+# The recommendation services are async themselves and do the same internally.
+# Endpoints returning ORM rows hand them straight to response_model, which validates them
+# once (from_attributes) instead of a BundleOut being built here and validated again.
 
 @router.post("/recommend", response_model=List[BundleCreate])
-def recommend(req: RecommendRequest, db: Session = Depends(get_db)):
-    bundles = recommend_bundles(db, store_id=req.store_id, num_bundles=req.num_bundles)
+async def recommend(req: RecommendRequest, db: Session = Depends(get_db)):
+    bundles = await recommend_bundles(db, store_id=req.store_id, num_bundles=req.num_bundles)
     return bundles
 
 
 @router.post("/recommend/ai", response_model=List[BundleCreate])
-def recommend_ai(req: AIRecommendRequest, db: Session = Depends(get_db)):
-    bundles = generate_bundles_for_store(db, store_id=req.store_id, num_bundles=req.num_bundles)
+async def recommend_ai(req: AIRecommendRequest, db: Session = Depends(get_db)):
+    bundles = await generate_bundles_for_store(db, store_id=req.store_id, num_bundles=req.num_bundles)
     return bundles
 
 
 @router.post("/recommend/ai/save", response_model=List[BundleOut])
-def recommend_ai_and_save(req: AIRecommendRequest, db: Session = Depends(get_db)):
-    candidates = generate_bundles_for_store(db, store_id=req.store_id, num_bundles=req.num_bundles)
-    saved_out: list[BundleOut] = []
-    for c in candidates:
-        saved = create_bundle(db, c)
-        saved_out.append(
-            BundleOut(
-                id=saved.id,
-                name=saved.name,
-                description=saved.description,
-                products=saved.products,
-                images=saved.images,
-                image_url=saved.image_url,
-                stock=saved.stock,
-                price=float(saved.price) if saved.price else None,
-                original_price=float(saved.original_price) if saved.original_price else None,
-                total_cost=float(saved.total_cost) if saved.total_cost else None,
-                created_at=saved.created_at,
-            )
-        )
-    return saved_out
+async def recommend_ai_and_save(req: AIRecommendRequest, db: Session = Depends(get_db)):
+    candidates = await generate_bundles_for_store(db, store_id=req.store_id, num_bundles=req.num_bundles)
+    saved = await run_in_threadpool(create_bundles_bulk, db, candidates)
+    # The next request should get fresh suggestions rather than the ones just saved
+    forget_bundle_suggestions(req.store_id)
+    return saved
 
 
 @router.post("/save", response_model=BundleOut)
-def save_bundle(bundle: BundleCreate, db: Session = Depends(get_db)):
-    saved = create_bundle(db, bundle)
-    # Return as BundleOut
-    return BundleOut(
-        id=saved.id,
-        name=saved.name,
-        description=saved.description,
-        products=saved.products,  # pydantic will coerce list of dicts
-        images=saved.images,
-        image_url=saved.image_url,
-        stock=saved.stock,
-        price=float(saved.price) if saved.price else None,
-        original_price=float(saved.original_price) if saved.original_price else None,
-        total_cost=float(saved.total_cost) if saved.total_cost else None,
-        created_at=saved.created_at,
-    )
+async def save_bundle(bundle: BundleCreate, db: Session = Depends(get_db)):
+    return await run_in_threadpool(create_bundle, db, bundle)
 
 
 @router.get("/{bundle_id}", response_model=BundleOut)
-def get_bundle_by_id(bundle_id: str, db: Session = Depends(get_db)):
-    b = get_bundle(db, bundle_id)
+async def get_bundle_by_id(bundle_id: str, db: Session = Depends(get_db)):
+    b = await run_in_threadpool(get_bundle, db, bundle_id)
     if not b:
         raise HTTPException(status_code=404, detail="Bundle not found")
-    return BundleOut(
-        id=b.id,
-        name=b.name,
-        description=b.description,
-        products=b.products,
-        images=b.images,
-        image_url=b.image_url,
-        stock=b.stock,
-        price=float(b.price) if b.price else None,
-        original_price=float(b.original_price) if b.original_price else None,
-        total_cost=float(b.total_cost) if b.total_cost else None,
-        created_at=b.created_at,
-    )
-
-
-@router.get("", response_model=List[BundleOut])
-def list_bundles(store_id: str = Query(...), limit: int = 50, offset: int = 0, db: Session = Depends(get_db)):
-    items = list_bundles_by_store(db, store_id=store_id, limit=limit, offset=offset)
-    return [
-        BundleOut(
-            id=b.id,
-            name=b.name,
-            description=b.description,
-            products=b.products,
-            images=b.images,
-            image_url=b.image_url,
-            stock=b.stock,
-            price=float(b.price) if b.price else None,
-            original_price=float(b.original_price) if b.original_price else None,
-            total_cost=float(b.total_cost) if b.total_cost else None,
-            created_at=b.created_at,
-        )
-        for b in items
-    ]
+    return b
+
+
+@router.get("/{bundle_id}/image")
+async def get_bundle_image(bundle_id: str, request: Request, v: Optional[str] = None, db: Session = Depends(get_db)):
+    """
+    Serve a bundle's image stored in the database.
+    
+    The ETag is the image's SHA-256, so a client holding the current image gets a 304
+    after one small metadata query, without the bytes being read. URLs carrying the
+    matching ?v= version never change content and are cached as immutable.
+    """
+    meta = await run_in_threadpool(get_bundle_image_meta, bundle_id, db)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    etag = f'"{meta.sha256}"'
+    if v == meta.sha256[:16]:
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        # The unversioned URL follows the bundle's latest image, so clients revalidate
+        cache_control = "no-cache"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    content = await run_in_threadpool(get_image_data, meta.sha256, db)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return Response(content=content, media_type=meta.content_type or "image/png", headers=headers)
+
+
+@router.get("", response_model=Union[List[BundleOut], List[BundleListItem]])
+async def list_bundles(
+    store_id: str = Query(...),
+    limit: int = 50,
+    offset: int = 0,
+    include_products: bool = False,
+    db: Session = Depends(get_db),
+):
+    key = (store_id, "list", limit, offset, include_products)
+    cached = bundle_cache.get(key)
+    if cached is None:
+        if include_products:
+            items, total = await run_in_threadpool(list_bundles_by_store, db, store_id=store_id, limit=limit, offset=offset)
+            body = _BUNDLES_OUT.dump_json(_BUNDLES_OUT.validate_python(items, from_attributes=True))
+        else:
+            # List views only need the summary; the products JSONB is left in the database
+            rows, total = await run_in_threadpool(list_bundle_summaries_by_store, db, store_id=store_id, limit=limit, offset=offset)
+            body = _BUNDLE_LIST_ITEMS.dump_json(_BUNDLE_LIST_ITEMS.validate_python(rows, from_attributes=True))
+        # The serialized body is cached, so a hit skips validation and encoding entirely
+        cached = (body, total)
+        bundle_cache.set(key, cached)
+    body, total = cached
+    return _json_response(body, {"X-Total-Count": str(total)})
 
 
 # IMAGE GENERATION ENDPOINTS
 
 @router.post("/{bundle_id}/generate-image")
-def generate_image_for_bundle(bundle_id: str, db: Session = Depends(get_db)) -> Dict[str, Any]:
+async def generate_image_for_bundle(bundle_id: str, db: Session = Depends(get_db)) -> Dict[str, Any]:
     """
     Generate an AI image for a specific bundle using Fal.AI.
     Updates the bundle record with the generated image URL.
     """
     try:
-        image_url = generate_and_update_bundle_image(db, bundle_id)
+        image_url = await generate_and_update_bundle_image(db, bundle_id)
         
         if image_url:
             return {
@@ -145,10 +163,10 @@ def generate_image_for_bundle(bundle_id: str, db: Session = Depends(get_db)) ->
 
 
 @router.post("/generate-images/batch")
-def generate_images_for_store_bundles(
+async def generate_images_for_store_bundles(
     store_id: str,
     limit: int = Query(default=10, description="Maximum number of bundles to process"),
-    max_concurrent: int = Query(default=3, description="Maximum concurrent image generations"),
+    max_concurrent: Optional[int] = Query(default=None, description="Maximum concurrent image generations (defaults to IMAGE_CONCURRENCY)"),
     db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
     """
@@ -157,10 +175,7 @@ def generate_images_for_store_bundles(
     """
     try:
         # Get bundles without images
-        bundles_without_images = db.query(Bundle).filter(
-            Bundle.store_id == store_id,
-            Bundle.image_url.is_(None)
-        ).limit(limit).all()
+        bundles_without_images = await run_in_threadpool(list_bundles_without_image, db, store_id, limit)
         
         if not bundles_without_images:
             return {
@@ -170,22 +185,11 @@ def generate_images_for_store_bundles(
             }
         
         # Generate images
-        results = generate_images_for_bundles(bundles_without_images, max_concurrent)
-        
-        # Update bundles with generated images
-        updated_count = 0
-        failed_count = 0
+        results = await generate_images_for_bundles_async(bundles_without_images, max_concurrent)
         
-        for bundle_id, image_url in results.items():
-            if image_url:
-                bundle = db.query(Bundle).filter(Bundle.id == bundle_id).first()
-                if bundle:
-                    bundle.image_url = image_url
-                    updated_count += 1
-            else:
-                failed_count += 1
-        
-        db.commit()
+        # Update bundles with generated images in one batched UPDATE
+        updated_count = await run_in_threadpool(update_bundle_image_urls, db, results)
+        failed_count = len(results) - updated_count
         
         return {
             "success": True,
@@ -197,58 +201,40 @@ def generate_images_for_store_bundles(
         }
         
     except Exception as e:
-        db.rollback()
+        await run_in_threadpool(db.rollback)
         raise HTTPException(status_code=500, detail=f"Batch image generation failed: {str(e)}")
 
 
 @router.post("/recommend/ai/save-with-images", response_model=List[BundleOut])
-def recommend_ai_save_and_generate_images(
+async def recommend_ai_save_and_generate_images(
     req: AIRecommendRequest, 
     db: Session = Depends(get_db)
-) -> List[BundleOut]:
+) -> Response:
     """
     AI recommend bundles, save them, and immediately generate images.
     This combines bundle creation and image generation in one efficient call.
     """
     # Generate bundle recommendations
-    candidates = generate_bundles_for_store(db, store_id=req.store_id, num_bundles=req.num_bundles)
+    candidates = await generate_bundles_for_store(db, store_id=req.store_id, num_bundles=req.num_bundles)
     
     if not candidates:
         return []
     
-    saved_bundles = []
+    # Save bundles first, in a single INSERT
+    saved_bundles = await run_in_threadpool(create_bundles_bulk, db, candidates)
+    forget_bundle_suggestions(req.store_id)
     
-    # Save bundles first
-    for candidate in candidates:
-        saved = create_bundle(db, candidate)
-        saved_bundles.append(saved)
+    # Convert to BundleOut format
+    out = _BUNDLES_OUT.validate_python(saved_bundles, from_attributes=True)
     
-    # Generate images for the saved bundles
+    # Generate images for the saved bundles concurrently, then store them in one UPDATE
     if saved_bundles:
-        image_results = generate_images_for_bundles(saved_bundles, max_concurrent=3)
+        image_results = await generate_images_for_bundles_async(saved_bundles)
+        await run_in_threadpool(update_bundle_image_urls, db, image_results)
         
-        # Update bundles with generated images (now frontend-accessible URLs)
-        for bundle in saved_bundles:
-            if bundle.id in image_results and image_results[bundle.id]:
-                # Image URLs are already converted to public format in image_generator.py
+        # Image URLs are already converted to public format in image_generator.py
+        for bundle in out:
+            if image_results.get(bundle.id):
                 bundle.image_url = image_results[bundle.id]
-        
-        db.commit()
     
-    # Convert to BundleOut format
-    return [
-        BundleOut(
-            id=bundle.id,
-            name=bundle.name,
-            description=bundle.description,
-            products=bundle.products,
-            images=bundle.images,
-            image_url=bundle.image_url,
-            stock=bundle.stock,
-            price=float(bundle.price) if bundle.price else None,
-            original_price=float(bundle.original_price) if bundle.original_price else None,
-            total_cost=float(bundle.total_cost) if bundle.total_cost else None,
-            created_at=bundle.created_at,
-        )
-        for bundle in saved_bundles
-    ]
+    return _json_response(_BUNDLES_OUT.dump_json(out))
@@ -5,52 +5,215 @@ Simple proxy to serve images from the local image server via the main API.
 This allows frontend to access images through public API URLs.
 """
 
-import requests
+import asyncio
+import base64
+import hashlib
 import logging
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import Response
-from ..config import settings
+import re
+from typing import Dict
+
+import httpx
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+from ..config import get_settings
+from ..utils.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 # Use the configured image API URL (huggle.tech in production)
-IMAGE_SERVER_BASE_URL = settings.local_image_api_url
+IMAGE_SERVER_BASE_URL = get_settings().local_image_api_url
+
+# Pooled upstream clients, so repeated image fetches reuse keep-alive connections. An httpx
+# client belongs to the event loop it first ran on and is closed on shutdown, so there is one
+# per loop, rebuilt if a later app lifespan finds it closed.
+_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Return the upstream client for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = httpx.AsyncClient(
+            base_url=IMAGE_SERVER_BASE_URL,
+            timeout=30,
+            limits=httpx.Limits(max_keepalive_connections=100),
+        )
+    return client
+
+
+# Generated image names are uuid/job-id based; anything else (paths, "..", NUL) is rejected
+_VALID_NAME = re.compile(r"[A-Za-z0-9_-]{1,128}\.png")
+
+
+# Generated images never change for a given filename, so recent ones are kept in memory
+# (body + ETag) for as long as clients are told to cache them. Larger files are only streamed.
+# The cache is bounded by entry count and by the total bytes held (per worker).
+IMAGE_CACHE_TTL = 3600
+_CACHEABLE_MAX_BYTES = 4 * 1024 * 1024
+_IMAGE_CACHE_SIZE = get_settings().image_cache_size
+_IMAGE_CACHE_MAX_BYTES = get_settings().image_cache_max_bytes
+_image_cache = TTLCache(
+    ttl=IMAGE_CACHE_TTL if _IMAGE_CACHE_SIZE > 0 and _IMAGE_CACHE_MAX_BYTES > 0 else 0,
+    maxsize=max(_IMAGE_CACHE_SIZE, 1),
+    maxweight=_IMAGE_CACHE_MAX_BYTES,
+    weigh=lambda entry: len(entry[1]),  # (etag, content)
+)
+
+
+def _image_headers(filename: str, etag: str | None = None) -> dict:
+    headers = {
+        "Cache-Control": f"public, max-age={IMAGE_CACHE_TTL}",  # Cache for 1 hour
+        "Content-Disposition": f"inline; filename={filename}",
+        "Vary": "Accept-Encoding",
+    }
+    if etag:
+        headers["ETag"] = etag
+    return headers
+
+
+def _etag(content: bytes) -> str:
+    return f'"{hashlib.blake2b(content, digest_size=16).hexdigest()}"'
+
+
+async def close_image_client() -> None:
+    """Close the running loop's upstream client (called on app shutdown)."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
 
 
 @router.get("/generated/{filename}")
-async def serve_generated_image(filename: str):
+async def serve_generated_image(filename: str, request: Request):
     """
     Proxy images from local image generation server.
     
     Frontend accesses: /api/images/generated/abc123.png
     Backend proxies from: https://image.huggle.tech/images/abc123.png (or localhost in dev)
+    
+    Recently served images are answered from memory, and a matching If-None-Match gets
+    a 304. Images too large to cache are streamed through rather than buffered.
     """
+    if not _VALID_NAME.fullmatch(filename):
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    
+    cached = _image_cache.get((filename,))
+    if cached is not None:
+        etag, content = cached
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=_image_headers(filename, etag))
+        return Response(content=content, media_type="image/png", headers=_image_headers(filename, etag))
+    
     try:
-        # Validate filename (basic security)
-        if not filename.endswith('.png') or '/' in filename or '..' in filename:
-            raise HTTPException(status_code=400, detail="Invalid filename")
-        
         # Get image from local server
-        local_url = f"{IMAGE_SERVER_BASE_URL}/images/{filename}"
-        
-        response = requests.get(local_url, timeout=30)
-        response.raise_for_status()
-        
-        # Return image with proper headers
-        return Response(
-            content=response.content,
-            media_type="image/png",
-            headers={
-                "Cache-Control": "public, max-age=3600",  # Cache for 1 hour
-                "Content-Disposition": f"inline; filename={filename}"
-            }
-        )
-        
-    except requests.RequestException as e:
+        client = _get_client()
+        upstream_request = client.build_request("GET", f"/images/{filename}")
+        upstream = await client.send(upstream_request, stream=True)
+    except httpx.HTTPError as e:
         logger.error(f"Failed to fetch image {filename}: {e}")
         raise HTTPException(status_code=404, detail="Image not found")
-    except Exception as e:
-        logger.error(f"Error serving image {filename}: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+    
+    if upstream.is_error:
+        await upstream.aclose()
+        logger.error(f"Failed to fetch image {filename}: upstream returned {upstream.status_code}")
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    length = upstream.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) <= _CACHEABLE_MAX_BYTES:
+        try:
+            content = await upstream.aread()
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to fetch image {filename}: {e}")
+            raise HTTPException(status_code=404, detail="Image not found")
+        finally:
+            await upstream.aclose()
+        etag = _etag(content)
+        _image_cache.set((filename,), (etag, content))
+        return Response(content=content, media_type="image/png", headers=_image_headers(filename, etag))
+    
+    headers = _image_headers(filename)
+    # Raw bytes are passed through undecoded, so their framing headers go with them
+    for name in ("content-length", "content-encoding"):
+        if name in upstream.headers:
+            headers[name] = upstream.headers[name]
+    
+    # Return image with proper headers; the upstream response is closed once fully sent
+    return StreamingResponse(
+        upstream.aiter_raw(),
+        media_type="image/png",
+        headers=headers,
+        background=BackgroundTask(upstream.aclose),
+    )
+
+
+# Upper bound on names per batch request, so one call can't fan out without limit
+MAX_BATCH_IMAGES = 20
+
+
+async def _fetch_image_bytes(filename: str) -> bytes | None:
+    """Return an image's bytes from the memory cache or the image server, None if unavailable.
+
+    Images larger than _CACHEABLE_MAX_BYTES are also None: they are refused by their
+    Content-Length, or abandoned once the body runs past the limit, rather than buffered.
+    """
+    cached = _image_cache.get((filename,))
+    if cached is not None:
+        return cached[1]
+    client = _get_client()
+    try:
+        resp = await client.send(client.build_request("GET", f"/images/{filename}"), stream=True)
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to fetch image {filename}: {e}")
+        return None
+    try:
+        if resp.is_error:
+            logger.error(f"Failed to fetch image {filename}: upstream returned {resp.status_code}")
+            return None
+        length = resp.headers.get("content-length")
+        if length is not None and length.isdigit() and int(length) > _CACHEABLE_MAX_BYTES:
+            logger.warning(f"Skipping image {filename} in batch: {length} bytes is over the limit")
+            return None
+        content = bytearray()
+        async for chunk in resp.aiter_bytes():
+            content += chunk
+            if len(content) > _CACHEABLE_MAX_BYTES:
+                logger.warning(f"Skipping image {filename} in batch: body is over the limit")
+                return None
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to fetch image {filename}: {e}")
+        return None
+    finally:
+        await resp.aclose()
+    content = bytes(content)
+    _image_cache.set((filename,), (_etag(content), content))
+    return content
+
+
+@router.get("/generated-batch")
+async def serve_generated_images_batch(
+    names: str = Query(..., description="Comma-separated image filenames, e.g. a.png,b.png"),
+):
+    """
+    Fetch several generated images in one call.
+    
+    Uncached images are requested from the image server concurrently over the shared
+    client's pooled connections, so N images cost about one upstream round-trip instead of N.
+    Returns {filename: base64 PNG}, with null for images that could not be fetched or
+    are too large to inline (over _CACHEABLE_MAX_BYTES; fetch those individually).
+    """
+    filenames = list(dict.fromkeys(n.strip() for n in names.split(",") if n.strip()))
+    if not filenames or len(filenames) > MAX_BATCH_IMAGES:
+        raise HTTPException(status_code=400, detail=f"Provide 1-{MAX_BATCH_IMAGES} filenames")
+    if not all(_VALID_NAME.fullmatch(n) for n in filenames):
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    
+    async with asyncio.TaskGroup() as tg:
+        tasks = [tg.create_task(_fetch_image_bytes(n)) for n in filenames]
+    
+    return {
+        name: base64.b64encode(content).decode("ascii") if content is not None else None
+        for name, content in zip(filenames, (t.result() for t in tasks))
+    }
@@ -1,6 +1,6 @@
 from datetime import datetime, date
 from typing import List, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 
 class ProductIn(BaseModel):
@@ -14,6 +14,11 @@ class ProductIn(BaseModel):
     original_price: Optional[float] = Field(default=None, description="Original price before any discounts")
 
 
+def _numeric_to_float(v):
+    # Numeric columns come back as Decimal; unset (0) prices are reported as null
+    return float(v) if v else None
+
+
 class BundleBase(BaseModel):
     name: str
     description: Optional[str] = None
@@ -32,11 +37,30 @@ class BundleCreate(BundleBase):
 
 
 class BundleOut(BundleBase):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str
+    created_at: datetime
+
+    _prices_to_float = field_validator("price", "original_price", "total_cost", mode="before")(_numeric_to_float)
+
+
+class BundleListItem(BaseModel):
+    """Bundle summary for list views: everything in BundleOut except the products payload."""
+    model_config = ConfigDict(from_attributes=True)
+
     id: str
+    name: str
+    description: Optional[str] = None
+    images: List[str] = []
+    image_url: Optional[str] = None
+    stock: int = 0
+    price: Optional[float] = None
+    original_price: Optional[float] = None
+    total_cost: Optional[float] = None
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    _prices_to_float = field_validator("price", "original_price", "total_cost", mode="before")(_numeric_to_float)
 
 
 class RecommendRequest(BaseModel):
@@ -1,16 +1,32 @@
-import json
+import asyncio
+import hashlib
+import operator
 import re
-from typing import Tuple
+import time
+from collections import deque
+from typing import Any, Awaitable, Tuple
 
 import httpx
+import orjson
+from fastapi.concurrency import run_in_threadpool
 
-from ..config import settings
-from ..utils.dates import parse_expiry as _safe_parse_dt
+from ..config import get_settings
 from ..schemas.bundle import ProductIn, BundleCreate
-from ..clients.inventory import fetch_products_for_store
-from datetime import datetime, timezone
+from ..clients.inventory import FAR_FUTURE, InventoryProduct, fetch_products_for_store
+from datetime import datetime
 from ..utils.text import parse_tags_str as __parse_tags
-from ..repositories.bundles import bundle_exists_for_products
+from ..repositories.bundles import existing_bundle_signatures
+from ..utils.signatures import compute_signature_from_id_list
+from ..utils.cache import TTLCache
+
+
+# Opening ```/```json fence line and closing fence around an LLM's JSON reply
+_FENCE_RE = re.compile(r"^```(?:json)?\n|```$", re.IGNORECASE | re.MULTILINE)
+# Outermost {...} block in free text
+_OBJ_RE = re.compile(r"\{[\s\S]*\}")
+
+# (product, parsed expiry, expiry as a POSIX timestamp)
+CatalogEntry = Tuple[InventoryProduct, datetime, float]
 
 
 def _extract_json_object(text: str) -> dict | None:
@@ -19,294 +35,403 @@ def _extract_json_object(text: str) -> dict | None:
         return None
     # Fast path
     try:
-        return json.loads(text)
+        return orjson.loads(text)
     except Exception:
         pass
     # Strip backticks fences if present
     text2 = text.strip()
     if text2.startswith("```"):
-        text2 = re.sub(r"^```(?:json)?\\n|```$", "", text2, flags=re.IGNORECASE | re.MULTILINE).strip()
+        text2 = _FENCE_RE.sub("", text2).strip()
         try:
-            return json.loads(text2)
+            return orjson.loads(text2)
         except Exception:
             pass
     # Fallback: find first {...} block
-    m = re.search(r"\{[\s\S]*\}", text)
+    m = _OBJ_RE.search(text)
     if m:
         try:
-            return json.loads(m.group(0))
+            return orjson.loads(m.group(0))
         except Exception:
             return None
     return None
 
 
-def _openrouter_generate(name_hint: str, product_names: list[str], stock: int) -> Tuple[str, str] | None:
-    if not settings.openrouter_api_key:
-        return None
-    # Default to the free DeepSeek chat model if unspecified
-    model = settings.openrouter_model or "deepseek/deepseek-chat-v3.1:free"
-    url = "https://openrouter.ai/api/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {settings.openrouter_api_key}",
-        "Content-Type": "application/json",
-        # Optional headers that some OpenRouter setups recommend
-        "HTTP-Referer": "http://localhost",  # adjust in production
-        "X-Title": "Bundling API",
-    }
-    system = (
-        "You name and describe retail product bundles succinctly. "
-        "Return a compact JSON object with keys 'name' and 'description'."
-    )
-    user = (
-        "Propose an improved, catchy yet honest bundle name and a single-sentence description.\n"
-        f"Current name: {name_hint}\n"
-        f"Products: {', '.join(product_names)}\n"
-        f"Stock (min across items): {stock}\n"
-        "Respond ONLY with JSON: {\"name\": string, \"description\": string}."
-    )
+_OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+_GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
+# Default to the free DeepSeek chat model if unspecified
+_OPENROUTER_DEFAULT_MODEL = "deepseek/deepseek-chat-v3.1:free"
+# Optional headers that some OpenRouter setups recommend
+_OPENROUTER_EXTRA_HEADERS = {
+    "HTTP-Referer": "http://localhost",  # adjust in production
+    "X-Title": "Bundling API",
+}
+
+# Pooled client for all provider calls, so repeat requests reuse the TLS connection instead
+# of paying a fresh handshake each time. An httpx client belongs to the event loop it first
+# ran on and is closed on app shutdown, so there is one per loop, rebuilt once closed.
+_clients: dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Return the LLM provider client for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = httpx.AsyncClient(
+            timeout=httpx.Timeout(12.0),
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+        )
+    return client
+
+
+async def close_ai_client() -> None:
+    """Close the running loop's LLM provider client (called on app shutdown)."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+class _ProviderGuard:
+    """Concurrency cap plus a simple circuit breaker for one LLM provider.
+
+    Calls beyond ``max_concurrent`` are refused instead of queueing behind slow ones, and
+    once at least half of the last ``window`` calls failed the provider is skipped for
+    ``cooldown`` seconds. Refused calls fail fast, so the race falls through to the other
+    provider (or returns None) rather than holding a request open.
+    """
+
+    def __init__(self, max_concurrent: int = 16, window: int = 10, cooldown: float = 30.0):
+        self.slots = asyncio.Semaphore(max_concurrent)
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._cooldown = cooldown
+        self._open_until = 0.0
+
+    def available(self) -> bool:
+        return not self.slots.locked() and time.monotonic() >= self._open_until
+
+    def record(self, ok: bool) -> None:
+        self._outcomes.append(ok)
+        outcomes = self._outcomes
+        if len(outcomes) == outcomes.maxlen and outcomes.count(False) * 2 >= len(outcomes):
+            self._open_until = time.monotonic() + self._cooldown
+            # Start the next window fresh once the provider is retried
+            outcomes.clear()
+
+
+_guards = {_OPENROUTER_URL: _ProviderGuard(), _GROQ_URL: _ProviderGuard()}
+
+
+_SYS_BUNDLE_TEXT = (
+    "You name and describe retail product bundles succinctly. "
+    "Return a compact JSON object with keys 'name' and 'description'."
+)
+_SYS_BUNDLE_GEN = (
+    "You create retail product bundles to reduce waste and increase sales. "
+    "Only use product IDs from the provided catalog. Prioritize items expiring soon. "
+    "Avoid zero-stock items. Bundle size: 2-5 items. Output JSON only."
+)
+
+
+async def _chat_completion(
+    url: str,
+    api_key: str,
+    model: str,
+    system: str,
+    user: str,
+    temperature: float,
+    timeout: float,
+    extra_headers: dict[str, str] | None = None,
+) -> dict | None:
+    """POST one chat completion and return the JSON object in the reply, or None on any failure."""
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+    if extra_headers:
+        headers.update(extra_headers)
     data = {
         "model": model,
         "messages": [
             {"role": "system", "content": system},
             {"role": "user", "content": user},
         ],
-        "temperature": 0.7,
+        "temperature": temperature,
     }
+    guard = _guards[url]
+    if not guard.available():
+        return None
+    async with guard.slots:
+        try:
+            resp = await _get_client().post(url, headers=headers, content=orjson.dumps(data), timeout=timeout)
+            resp.raise_for_status()
+        except httpx.HTTPError:
+            # Timeouts, connection errors and error statuses count against the breaker; a call
+            # cancelled because the other provider won the race does not
+            guard.record(False)
+            return None
+        guard.record(True)
     try:
-        resp = httpx.post(url, headers=headers, json=data, timeout=httpx.Timeout(10.0))
-        resp.raise_for_status()
-        content = resp.json()["choices"][0]["message"]["content"]
+        content = orjson.loads(resp.content)["choices"][0]["message"]["content"]
         payload = _extract_json_object(content)
-        if not payload:
-            return None
-        name = str(payload.get("name") or "").strip()
-        desc = str(payload.get("description") or "").strip()
-        if name and desc:
-            return name, desc
     except Exception:
         return None
-    return None
+    return payload if isinstance(payload, dict) else None
 
 
-def _groq_generate(name_hint: str, product_names: list[str], stock: int) -> Tuple[str, str] | None:
-    if not settings.groq_api_key:
-        return None
-    model = settings.groq_model  # require explicit model for reliability
-    if not model:
-        # If no model is configured, skip rather than guess
-        return None
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {settings.groq_api_key}",
-        "Content-Type": "application/json",
-    }
-    system = (
-        "You name and describe retail product bundles succinctly. "
-        "Return a compact JSON object with keys 'name' and 'description'."
-    )
-    user = (
+def _bundle_text_prompt(name_hint: str, product_names: list[str], stock: int) -> str:
+    return (
         "Propose an improved, catchy yet honest bundle name and a single-sentence description.\n"
         f"Current name: {name_hint}\n"
         f"Products: {', '.join(product_names)}\n"
         f"Stock (min across items): {stock}\n"
         "Respond ONLY with JSON: {\"name\": string, \"description\": string}."
     )
-    data = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
-        "temperature": 0.7,
-    }
-    try:
-        resp = httpx.post(url, headers=headers, json=data, timeout=httpx.Timeout(10.0))
-        resp.raise_for_status()
-        content = resp.json()["choices"][0]["message"]["content"]
-        payload = _extract_json_object(content)
-        if not payload:
-            return None
-        name = str(payload.get("name") or "").strip()
-        desc = str(payload.get("description") or "").strip()
-        if name and desc:
-            return name, desc
-    except Exception:
+
+
+def _name_and_description(payload: dict | None) -> Tuple[str, str] | None:
+    if not payload:
         return None
+    name = str(payload.get("name") or "").strip()
+    desc = str(payload.get("description") or "").strip()
+    if name and desc:
+        return name, desc
     return None
 
 
-def maybe_enhance_bundle_text(name_hint: str, product_names: list[str], stock: int) -> Tuple[str, str] | None:
+async def _openrouter_generate(name_hint: str, product_names: list[str], stock: int) -> Tuple[str, str] | None:
+    settings = get_settings()
+    if not settings.openrouter_api_key:
+        return None
+    payload = await _chat_completion(
+        _OPENROUTER_URL, settings.openrouter_api_key, settings.openrouter_model or _OPENROUTER_DEFAULT_MODEL,
+        _SYS_BUNDLE_TEXT, _bundle_text_prompt(name_hint, product_names, stock), 0.7, 10.0, _OPENROUTER_EXTRA_HEADERS,
+    )
+    return _name_and_description(payload)
+
+
+async def _groq_generate(name_hint: str, product_names: list[str], stock: int) -> Tuple[str, str] | None:
+    settings = get_settings()
+    # Require an explicit model for reliability: if none is configured, skip rather than guess
+    if not settings.groq_api_key or not settings.groq_model:
+        return None
+    payload = await _chat_completion(
+        _GROQ_URL, settings.groq_api_key, settings.groq_model,
+        _SYS_BUNDLE_TEXT, _bundle_text_prompt(name_hint, product_names, stock), 0.7, 10.0,
+    )
+    return _name_and_description(payload)
+
+
+# Overall budgets for a provider race; match the per-request httpx timeouts
+ENHANCE_TIMEOUT = 10.0
+GENERATE_BUNDLES_TIMEOUT = 12.0
+
+
+def _provider_order() -> list[str]:
+    # Prioritized provider order: Groq -> OpenRouter (unless AI_PROVIDER says otherwise)
+    provider = (get_settings().ai_provider or "").lower().strip()
+    if provider == "openrouter":
+        return ["openrouter", "groq"]
+    return ["groq", "openrouter"]
+
+
+async def _first_success(calls: list[Awaitable[Any]], timeout: float) -> Any:
     """
-    Try to get an AI-improved (name, description) with prioritized providers:
-    1) Groq (fast path)
-    2) OpenRouter (fallback)
-    Returns None if both fail/misconfigured.
-    If AI_PROVIDER is explicitly set, use that order first, then the other provider as fallback.
+    Run provider calls concurrently and return the first truthy result, or None.
+
+    The losers are cancelled as soon as a winner is found (or the budget runs out).
+    If several finish together, the one earlier in ``calls`` wins.
     """
-    provider = (settings.ai_provider or "").lower().strip()
-    order = ["groq", "openrouter"]
-    if provider == "openrouter":
-        order = ["openrouter", "groq"]
-    for p in order:
-        if p == "groq":
-            res = _groq_generate(name_hint, product_names, stock)
-            if res:
-                return res
-        elif p == "openrouter":
-            res = _openrouter_generate(name_hint, product_names, stock)
-            if res:
-                return res
+    tasks = [asyncio.ensure_future(c) for c in calls]
+    try:
+        async with asyncio.timeout(timeout):
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in tasks:
+                    if t in done and not t.cancelled() and t.exception() is None and t.result():
+                        return t.result()
+    except TimeoutError:
+        return None
+    finally:
+        for t in tasks:
+            t.cancel()
     return None
 
 
-def _format_product_catalog(products: list[dict]) -> list[str]:
-    lines: list[str] = []
-    now = datetime.now(timezone.utc)
-    for p in products:
-        pid = str(p.get("id"))
-        name = p.get("name") or "Unnamed"
-        ptype = p.get("productType") or "unknown"
-        stock = int(p.get("stock") or 0)
-        tags = str(p.get("tags") or "")
-        exp = _safe_parse_dt(p.get("expiresOn"))
-        if exp is None or (isinstance(exp, datetime) and exp.year < 1900):
-            days = 36500
-        else:
-            delta = exp - now
-            days = max(int(delta.total_seconds() // 86400), -1)
-        lines.append(f"{pid} | {name} | type:{ptype} | stock:{stock} | expires_in_days:{days} | tags:{tags}")
-    return lines
-
-
-def _openrouter_generate_bundles(catalog_lines: list[str], num_bundles: int) -> list[dict] | None:
-    if not settings.openrouter_api_key:
-        return None
-    model = settings.openrouter_model or "deepseek/deepseek-chat-v3.1:free"
-    url = "https://openrouter.ai/api/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {settings.openrouter_api_key}",
-        "Content-Type": "application/json",
-        "HTTP-Referer": "http://localhost",
-        "X-Title": "Bundling API",
+async def maybe_enhance_bundle_text(name_hint: str, product_names: list[str], stock: int) -> Tuple[str, str] | None:
+    """
+    Try to get an AI-improved (name, description) from Groq and OpenRouter at once,
+    taking whichever answers successfully first (AI_PROVIDER breaks ties).
+    Returns None if both fail/misconfigured.
+    """
+    calls = {
+        "groq": _groq_generate,
+        "openrouter": _openrouter_generate,
     }
-    system = (
-        "You create retail product bundles to reduce waste and increase sales. "
-        "Only use product IDs from the provided catalog. Prioritize items expiring soon. "
-        "Avoid zero-stock items. Bundle size: 2-5 items. Output JSON only."
+    return await _first_success(
+        [calls[p](name_hint, product_names, stock) for p in _provider_order()], ENHANCE_TIMEOUT
     )
-    user = (
+
+
+def _format_product_catalog(catalog: list[CatalogEntry]) -> list[str]:
+    now_ts = time.time()
+    # Far-future sentinels (unknown/invalid expiry) render as 100 years out
+    return [
+        f"{p.id} | {p.name or 'Unnamed'} | type:{p.product_type or 'unknown'} | stock:{p.stock}"
+        f" | expires_in_days:{_days_until(exp, exp_ts, now_ts)} | tags:{p.tags or ''}"
+        for p, exp, exp_ts in catalog
+    ]
+
+
+def _days_until(exp: datetime, exp_ts: float, now_ts: float) -> int:
+    if exp is FAR_FUTURE:
+        return 36500
+    return max(int((exp_ts - now_ts) // 86400), -1)
+
+
+def _bundle_gen_prompt(catalog_lines: list[str], num_bundles: int) -> str:
+    return (
         "Product Catalog (one per line):\n" + "\n".join(catalog_lines) + "\n\n" +
         f"Create up to {num_bundles} bundles as JSON: {{\"bundles\":[{{\"name\":str,\"description\":str,\"product_ids\":[str,...]}}...]}}"
     )
-    data = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
-        "temperature": 0.6,
-    }
-    try:
-        resp = httpx.post(url, headers=headers, json=data, timeout=httpx.Timeout(12.0))
-        resp.raise_for_status()
-        content = resp.json()["choices"][0]["message"]["content"]
-        payload = _extract_json_object(content) or {}
-        bundles = payload.get("bundles") or []
-        if isinstance(bundles, list):
-            return bundles
-    except Exception:
+
+
+def _bundle_list(payload: dict | None) -> list[dict] | None:
+    if payload is None:
         return None
-    return None
+    bundles = payload.get("bundles") or []
+    return bundles if isinstance(bundles, list) else None
 
 
-def _groq_generate_bundles(catalog_lines: list[str], num_bundles: int) -> list[dict] | None:
-    if not settings.groq_api_key:
+async def _openrouter_generate_bundles(catalog_lines: list[str], num_bundles: int) -> list[dict] | None:
+    settings = get_settings()
+    if not settings.openrouter_api_key:
         return None
-    model = settings.groq_model
-    if not model:
+    payload = await _chat_completion(
+        _OPENROUTER_URL, settings.openrouter_api_key, settings.openrouter_model or _OPENROUTER_DEFAULT_MODEL,
+        _SYS_BUNDLE_GEN, _bundle_gen_prompt(catalog_lines, num_bundles), 0.6, 12.0, _OPENROUTER_EXTRA_HEADERS,
+    )
+    return _bundle_list(payload)
+
+
+async def _groq_generate_bundles(catalog_lines: list[str], num_bundles: int) -> list[dict] | None:
+    settings = get_settings()
+    if not settings.groq_api_key or not settings.groq_model:
         return None
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {settings.groq_api_key}",
-        "Content-Type": "application/json",
-    }
-    system = (
-        "You create retail product bundles to reduce waste and increase sales. "
-        "Only use product IDs from the provided catalog. Prioritize items expiring soon. "
-        "Avoid zero-stock items. Bundle size: 2-5 items. Output JSON only."
+    payload = await _chat_completion(
+        _GROQ_URL, settings.groq_api_key, settings.groq_model,
+        _SYS_BUNDLE_GEN, _bundle_gen_prompt(catalog_lines, num_bundles), 0.6, 12.0,
     )
-    user = (
-        "Product Catalog (one per line):\n" + "\n".join(catalog_lines) + "\n\n" +
-        f"Create up to {num_bundles} bundles as JSON: {{\"bundles\":[{{\"name\":str,\"description\":str,\"product_ids\":[str,...]}}...]}}"
+    return _bundle_list(payload)
+
+
+# LLM bundle suggestions keyed by (store_id, num_bundles, catalog fingerprint). Concurrent
+# identical misses share one in-flight provider race instead of each calling out.
+_suggestion_cache = TTLCache(ttl=get_settings().ai_suggestion_cache_ttl, maxsize=512)
+_suggestions_in_flight: dict[tuple, asyncio.Future] = {}
+
+
+def forget_bundle_suggestions(store_id: str) -> None:
+    """Drop cached suggestions for a store, e.g. after some of them were saved."""
+    _suggestion_cache.invalidate(store_id)
+
+
+async def _suggest_bundles(store_id: str, num_bundles: int, catalog_lines: list[str]) -> list[dict] | None:
+    fingerprint = hashlib.blake2b("\n".join(catalog_lines).encode("utf-8"), digest_size=16).digest()
+    key = (store_id, num_bundles, fingerprint)
+    cached = _suggestion_cache.get(key)
+    if cached is not None:
+        return cached
+
+    task = _suggestions_in_flight.get(key)
+    if task is None:
+        # Ask both providers at once and keep the first usable answer
+        calls = {
+            "groq": _groq_generate_bundles,
+            "openrouter": _openrouter_generate_bundles,
+        }
+        task = asyncio.ensure_future(_first_success(
+            [calls[p](catalog_lines, num_bundles) for p in _provider_order()], GENERATE_BUNDLES_TIMEOUT
+        ))
+        _suggestions_in_flight[key] = task
+        task.add_done_callback(lambda _: _suggestions_in_flight.pop(key, None))
+
+    # Shielded so one caller going away doesn't cancel the race the others are waiting on
+    bundles_def = await asyncio.shield(task)
+    if bundles_def:
+        _suggestion_cache.set(key, bundles_def)
+    return bundles_def
+
+
+def _extract_product_ids(products) -> list[str]:
+    """Extract product IDs from various product representations."""
+    if isinstance(products, list):
+        ids = []
+        for item in products:
+            if isinstance(item, ProductIn):
+                ids.append(item.id)
+            elif isinstance(item, dict) and "id" in item:
+                ids.append(str(item["id"]))
+            elif isinstance(item, str):
+                ids.append(item)
+        return ids
+    return []
+
+
+_BY_EXPIRY_TS = operator.itemgetter(2)
+
+
+def _catalog_entry(p: InventoryProduct) -> CatalogEntry:
+    return p, p.expires_on, p.expires_on.timestamp()
+
+
+def _load_catalog(db, store_id: str) -> list[CatalogEntry]:
+    """Return the store's products by earliest expiry, capped to keep the prompt manageable.
+
+    Expiry timestamps are computed once here; the prompt and the candidate builder reuse the entries.
+    """
+    catalog = [_catalog_entry(p) for p in fetch_products_for_store(db, store_id)]
+    catalog.sort(key=_BY_EXPIRY_TS)
+    return catalog[:200]
+
+
+def _to_product_in(pr: InventoryProduct, expires_on: datetime) -> ProductIn:
+    return ProductIn(
+        id=pr.id,
+        name=pr.name or "Unnamed",
+        product_type=pr.product_type or None,
+        expires_on=expires_on,
+        stock=pr.stock,
+        tags=__parse_tags(pr.tags),
+        price=pr.price,
+        original_price=pr.original_price,
     )
-    data = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
-        "temperature": 0.6,
-    }
-    try:
-        resp = httpx.post(url, headers=headers, json=data, timeout=httpx.Timeout(12.0))
-        resp.raise_for_status()
-        content = resp.json()["choices"][0]["message"]["content"]
-        payload = _extract_json_object(content) or {}
-        bundles = payload.get("bundles") or []
-        if isinstance(bundles, list):
-            return bundles
-    except Exception:
-        return None
-    return None
 
 
-def generate_bundles_for_store(db, store_id: str, num_bundles: int = 3) -> list[BundleCreate]:
+async def generate_bundles_for_store(db, store_id: str, num_bundles: int = 3) -> list[BundleCreate]:
     if not store_id:
         return []
-    products_raw = fetch_products_for_store(db, store_id)
-
-    def extract_product_ids(products) -> list[str]:
-        """Extract product IDs from various product representations."""
-        if isinstance(products, list):
-            ids = []
-            for item in products:
-                if isinstance(item, ProductIn):
-                    ids.append(item.id)
-                elif isinstance(item, dict) and "id" in item:
-                    ids.append(str(item["id"]))
-                elif isinstance(item, str):
-                    ids.append(item)
-            return ids
-        return []
-    # Sort by earliest expiry and limit catalog size to keep prompt manageable
-    now = datetime.now(timezone.utc)
-    def expiry_key(p):
-        dt = _safe_parse_dt(p.get("expiresOn"))
-        if dt is None or (isinstance(dt, datetime) and dt.year < 1900):
-            return datetime(9999, 1, 1, tzinfo=timezone.utc)
-        return dt
-    products_raw = sorted(products_raw, key=expiry_key)[:200]
-
-    catalog_lines = _format_product_catalog(products_raw)
-    provider = (settings.ai_provider or "").lower().strip()
-    # Prioritized provider order: Groq -> OpenRouter (unless explicitly set otherwise)
-    order = ["groq", "openrouter"]
-    if provider == "openrouter":
-        order = ["openrouter", "groq"]
-
-    bundles_def: list[dict] | None = None
-    for p in order:
-        if p == "groq":
-            bundles_def = _groq_generate_bundles(catalog_lines, num_bundles)
-        elif p == "openrouter":
-            bundles_def = _openrouter_generate_bundles(catalog_lines, num_bundles)
-        if bundles_def:
-            break
+    # The Session is blocking, so DB work runs in the threadpool; the LLM calls are awaited on the loop
+    catalog = await run_in_threadpool(_load_catalog, db, store_id)
+
+    catalog_lines = _format_product_catalog(catalog)
+    bundles_def = await _suggest_bundles(store_id, num_bundles, catalog_lines)
 
     if not bundles_def:
         bundles_def = []
 
-    by_id = {str(p.get("id")): p for p in products_raw}
+    return await run_in_threadpool(_build_candidates, db, store_id, catalog, bundles_def, num_bundles)
+
+
+def _build_candidates(
+    db,
+    store_id: str,
+    catalog: list[CatalogEntry],
+    bundles_def: list[dict],
+    num_bundles: int,
+) -> list[BundleCreate]:
+    """Turn the LLM's bundle definitions into new (not yet existing) candidates, topped up with pairs."""
+    # Signatures already taken in this store, extended as candidates are accepted so the
+    # same product set isn't proposed twice in one call
+    existing = existing_bundle_signatures(db, store_id)
+    by_id = {entry[0].id: entry for entry in catalog}
     results: list[BundleCreate] = []
     for b in bundles_def:
         name = str(b.get("name") or "Unnamed Bundle").strip()
@@ -322,29 +447,18 @@ def generate_bundles_for_store(db, store_id: str, num_bundles: int = 3) -> list[
         # Map to ProductIn
         chosen_products: list[ProductIn] = []
         for pid in normalized_ids:
-            pr = by_id.get(str(pid))
-            if not pr:
+            entry = by_id.get(str(pid))
+            if not entry:
                 continue
+            pr, expires_on, _ = entry
             # Skip zero stock
-            if int(pr.get("stock") or 0) <= 0:
+            if pr.stock <= 0:
                 continue
-            expires_on = _safe_parse_dt(pr.get("expiresOn"))
-            if expires_on is None or (isinstance(expires_on, datetime) and expires_on.year < 1900):
-                expires_on = datetime(9999, 1, 1, tzinfo=timezone.utc)
-            chosen_products.append(ProductIn(
-                id=str(pr.get("id")),
-                name=pr.get("name") or "Unnamed",
-                product_type=pr.get("productType") or None,
-                expires_on=expires_on,
-                stock=int(pr.get("stock") or 0),
-                tags=__parse_tags(pr.get("tags")),
-                price=float(pr.get("price") or 0.0),
-                original_price=float(pr.get("originalPrice") or 0.0),
-            ))
+            chosen_products.append(_to_product_in(pr, expires_on))
         # Ensure 2-5 items
         if len(chosen_products) < 2:
             continue
-        stock = min([p.stock for p in chosen_products]) if chosen_products else 0
+        stock = min(p.stock for p in chosen_products)
         candidate = BundleCreate(
             store_id=store_id,
             name=name,
@@ -354,47 +468,33 @@ def generate_bundles_for_store(db, store_id: str, num_bundles: int = 3) -> list[
             stock=stock,
         )
         # Check if bundle with these products already exists
-        product_ids = extract_product_ids(candidate.products)
-        if not bundle_exists_for_products(db, store_id, product_ids):
+        signature = compute_signature_from_id_list(_extract_product_ids(candidate.products))
+        if signature not in existing:
+            existing.add(signature)
             results.append(candidate)
         if len(results) >= num_bundles:
             break
 
     # Top-up to reach exactly num_bundles with last-resort pairs
     if len(results) < num_bundles:
-        # Flatten pool by earliest expiry
-        pool_sorted = sorted(products_raw, key=expiry_key)
+        # The catalog is already ordered by earliest expiry
         i = 0
-        while len(results) < num_bundles and i + 1 < len(pool_sorted):
-            pr1, pr2 = pool_sorted[i], pool_sorted[i+1]
+        while len(results) < num_bundles and i + 1 < len(catalog):
+            (pr1, exp1, _), (pr2, exp2, _) = catalog[i], catalog[i+1]
             # skip zero stock
-            if int(pr1.get("stock") or 0) <= 0:
+            if pr1.stock <= 0:
                 i += 1
                 continue
-            if int(pr2.get("stock") or 0) <= 0:
+            if pr2.stock <= 0:
                 i += 2
                 continue
             # Check if bundle with these products already exists
-            product_ids = [str(pr1.get("id")), str(pr2.get("id"))]
-            if bundle_exists_for_products(db, store_id, product_ids):
+            signature = compute_signature_from_id_list([pr1.id, pr2.id])
+            if signature in existing:
                 i += 2
                 continue
-            def to_product_in(pr):
-                exp = _safe_parse_dt(pr.get("expiresOn"))
-                if exp is None or (isinstance(exp, datetime) and exp.year < 1900):
-                    exp = datetime(9999, 1, 1, tzinfo=timezone.utc)
-                return ProductIn(
-                    id=str(pr.get("id")),
-                    name=pr.get("name") or "Unnamed",
-                    product_type=pr.get("productType") or None,
-                    expires_on=exp,
-                    stock=int(pr.get("stock") or 0),
-                    tags=__parse_tags(pr.get("tags")),
-                    price=float(pr.get("price") or 0.0),
-                    original_price=float(pr.get("originalPrice") or 0.0),
-                )
-            chosen = [to_product_in(pr1), to_product_in(pr2)]
-            stock = min([p.stock for p in chosen])
+            chosen = [_to_product_in(pr1, exp1), _to_product_in(pr2, exp2)]
+            stock = min(pr1.stock, pr2.stock)
             candidate = BundleCreate(
                 store_id=store_id,
                 name="Quick Pair Pack",
@@ -403,9 +503,8 @@ def generate_bundles_for_store(db, store_id: str, num_bundles: int = 3) -> list[
                 images=[],
                 stock=stock,
             )
-            product_ids = extract_product_ids(candidate.products)
-            if not bundle_exists_for_products(db, store_id, product_ids):
-                results.append(candidate)
+            existing.add(signature)
+            results.append(candidate)
             i += 2
 
     return results
@@ -5,34 +5,218 @@ Stores generated images directly in Neon PostgreSQL database as BYTEA
 and serves them via API endpoints for frontend access.
 """
 
-import requests
+import asyncio
+import hashlib
 import logging
-from typing import Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import Column, Integer, LargeBinary, String, DateTime, func
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+import psycopg
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, joinedload, relationship
+from sqlalchemy import DDL, Column, ForeignKey, Index, Integer, LargeBinary, String, DateTime, bindparam, event, func, text
 from sqlalchemy.ext.declarative import declarative_base
 from fastapi import HTTPException
 from fastapi.responses import Response
 
 from ..db import Base, engine
+from .image_generator import get_client
 
 logger = logging.getLogger(__name__)
 
 
+class ImageBlob(Base):
+    """Image bytes stored once per distinct content, addressed by their SHA-256"""
+    __tablename__ = "image_blobs"
+    
+    sha256 = Column(String(64), primary_key=True)  # hex digest of image_data
+    # STORAGE EXTERNAL: kept out of line in TOAST but not compressed, since PNGs are
+    # already deflated and pglz would only spend CPU on every write (migration 0009)
+    image_data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+
+event.listen(
+    ImageBlob.__table__,
+    "after_create",
+    DDL("ALTER TABLE image_blobs ALTER COLUMN image_data SET STORAGE EXTERNAL").execute_if(dialect="postgresql"),
+)
+
+
 class BundleImage(Base):
     """Model for storing bundle images in database"""
     __tablename__ = "bundle_images"
+    # Answers get_bundle_image_meta (latest row per bundle, metadata only) with an index-only
+    # scan, so ETag checks never touch the heap; keep INCLUDE in sync with that query
+    __table_args__ = (
+        Index(
+            "ix_bundle_images_bundle_meta", "bundle_id", text("id DESC"),
+            postgresql_include=["sha256", "file_size", "content_type"],
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    bundle_id = Column(Integer, index=True, nullable=False)
-    image_data = Column(LargeBinary, nullable=False)  # Store image as binary data
+    bundle_id = Column(String, nullable=False)  # bundles.id (a UUID string)
+    # Bundles whose images are byte-identical (same prompt, retries) share one blob
+    sha256 = Column(String(64), ForeignKey("image_blobs.sha256"), index=True, nullable=False)
     content_type = Column(String, default="image/png")
     filename = Column(String, nullable=False)
     file_size = Column(Integer, nullable=False)
     created_at = Column(DateTime, server_default=func.now())
+    
+    blob = relationship(ImageBlob)
+    
+    @property
+    def image_data(self) -> bytes:
+        return self.blob.image_data
+
+
+# Download chunk size when streaming an image from the generation server
+_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+async def _download_image(url: str) -> bytes:
+    """Stream an image over the shared image-server pool into one preallocated buffer."""
+    async with get_client().stream("GET", url, timeout=30) as response:
+        response.raise_for_status()
+        length = response.headers.get("content-length")
+        # The length is only the decoded size when the body isn't content-encoded
+        if length is None or not length.isdigit() or "content-encoding" in response.headers:
+            return await response.aread()
+        buf = bytearray(int(length))
+        view = memoryview(buf)
+        offset = 0
+        async for chunk in response.aiter_bytes(_DOWNLOAD_CHUNK_SIZE):
+            view[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+        return bytes(view[:offset])
+
+
+# Columns written by store_images() and their Postgres types, as binary COPY needs them
+_BLOB_COPY_SQL = "COPY image_blobs (sha256, image_data) FROM STDIN WITH (FORMAT BINARY)"
+_BLOB_COPY_TYPES = ("text", "bytea")
+_COPY_COLUMNS = ("bundle_id", "sha256", "content_type", "filename", "file_size")
+_COPY_TYPES = ("text", "text", "text", "text", "int4")
+_COPY_SQL = f"COPY bundle_images ({', '.join(_COPY_COLUMNS)}) FROM STDIN WITH (FORMAT BINARY)"
+
+_EXISTING_BLOBS_STMT = text(
+    "SELECT sha256 FROM image_blobs WHERE sha256 IN :digests"
+).bindparams(bindparam("digests", expanding=True))
+
+
+def _copy_images(db: Session, images: List[Tuple[str, str, bytes, str]]) -> None:
+    # Only content the table doesn't have yet is sent; known images cost one digest each
+    digests = {digest for _, _, _, digest in images}
+    known = set(db.execute(_EXISTING_BLOBS_STMT, {"digests": list(digests)}).scalars())
+    # The psycopg connection behind the session, inside the session's transaction
+    raw = db.connection().connection.driver_connection
+    with raw.cursor() as cur:
+        if len(known) < len(digests):
+            with cur.copy(_BLOB_COPY_SQL) as copy:
+                copy.set_types(_BLOB_COPY_TYPES)
+                for _, _, image_data, digest in images:
+                    if digest not in known:
+                        copy.write_row((digest, image_data))
+                        known.add(digest)
+        with cur.copy(_COPY_SQL) as copy:
+            copy.set_types(_COPY_TYPES)
+            for bundle_id, filename, image_data, digest in images:
+                copy.write_row((bundle_id, digest, "image/png", filename, len(image_data)))
+
+
+def store_images(db: Session, images: Iterable[Tuple[str, str, bytes]]) -> List[str]:
+    """
+    Insert (bundle_id, filename, PNG bytes) rows with binary COPY and commit.
+    
+    Image bytes are content-addressed: each distinct image is written to image_blobs once,
+    and bundle_images rows only reference its SHA-256, so a repeated image moves no bytes.
+    Binary COPY ships each new image as raw bytes in the COPY stream, instead of an INSERT
+    parameter that is escaped into a second buffer and parsed per row. id and created_at
+    come from the table defaults, so nothing is read back.
+    
+    Returns:
+        SHA-256 hex digest of each stored image, in input order
+    """
+    images = [
+        (bundle_id, filename, image_data, hashlib.sha256(image_data).hexdigest())
+        for bundle_id, filename, image_data in images
+    ]
+    if not images:
+        return []
+    # A concurrent writer can store the same new image between the lookup and the COPY;
+    # the retry then finds it and only adds the references
+    for attempt in range(2):
+        try:
+            _copy_images(db, images)
+            db.commit()
+            return [digest for _, _, _, digest in images]
+        except psycopg.errors.UniqueViolation:
+            db.rollback()
+            if attempt:
+                raise
+        except Exception:
+            db.rollback()
+            raise
+
+
+def _image_filename(local_image_url: str) -> str:
+    filename = local_image_url.split('/')[-1]
+    if not filename.endswith('.png'):
+        filename = f"{filename}.png"
+    return filename
+
+
+async def _download_for_bundle(bundle_id: str, local_image_url: str) -> Optional[bytes]:
+    try:
+        logger.info(f"Downloading image for bundle {bundle_id}: {local_image_url}")
+        return await _download_image(local_image_url)
+    except (httpx.HTTPError, ValueError) as e:
+        logger.error(f"Failed to download image for bundle {bundle_id}: {e}")
+        return None
 
 
-def download_and_store_image(local_image_url: str, bundle_id: int, db: Session) -> Optional[str]:
+async def download_and_store_images(image_urls: Dict[str, str], db: Session) -> Dict[str, Optional[str]]:
+    """
+    Download several generated images concurrently and store them in one transaction.
+    
+    All downloaded images go into the database with a single COPY and one commit, instead
+    of a commit (and fsync) per image. Images that fail to download are skipped.
+    
+    Args:
+        image_urls: Bundle ID -> URL on the image generation server
+        db: Database session
+        
+    Returns:
+        Bundle ID -> database image URL, or None where the download or the insert failed
+    """
+    results: Dict[str, Optional[str]] = dict.fromkeys(image_urls)
+    downloads = await asyncio.gather(*(
+        _download_for_bundle(bundle_id, url) for bundle_id, url in image_urls.items()
+    ))
+    rows = [
+        (bundle_id, _image_filename(url), image_data)
+        for (bundle_id, url), image_data in zip(image_urls.items(), downloads)
+        if image_data is not None
+    ]
+    if not rows:
+        return results
+    
+    try:
+        # Store in database; the blocking COPY runs in the threadpool
+        digests = await run_in_threadpool(store_images, db, rows)
+    except Exception as e:
+        logger.error(f"Failed to store images for bundles {[r[0] for r in rows]} in database: {e}")
+        return results
+    
+    for (bundle_id, _, image_data), digest in zip(rows, digests):
+        # Database URL that frontend can access; the version pins it to this exact image,
+        # so it can be cached as immutable
+        results[bundle_id] = f"/api/bundles/{bundle_id}/image?v={digest[:16]}"
+        logger.info(f"Successfully stored image for bundle {bundle_id} in database (size: {len(image_data)} bytes)")
+    return results
+
+
+async def download_and_store_image(local_image_url: str, bundle_id: str, db: Session) -> Optional[str]:
     """
     Download image from local server and store in database.
     
@@ -44,51 +228,54 @@ def download_and_store_image(local_image_url: str, bundle_id: int, db: Session)
     Returns:
         Database image URL or None if failed
     """
-    try:
-        # Download image from local server
-        logger.info(f"Downloading image for bundle {bundle_id}: {local_image_url}")
-        response = requests.get(local_image_url, timeout=30)
-        response.raise_for_status()
-        
-        # Extract filename from URL
-        filename = local_image_url.split('/')[-1]
-        if not filename.endswith('.png'):
-            filename = f"{filename}.png"
-        
-        image_data = response.content
-        file_size = len(image_data)
-        
-        # Store in database
-        db_image = BundleImage(
-            bundle_id=bundle_id,
-            image_data=image_data,
-            content_type="image/png",
-            filename=filename,
-            file_size=file_size
-        )
-        
-        db.add(db_image)
-        db.commit()
-        db.refresh(db_image)
-        
-        # Return database URL that frontend can access
-        database_url = f"/api/bundles/{bundle_id}/image"
-        
-        logger.info(f"Successfully stored image for bundle {bundle_id} in database (size: {file_size} bytes)")
-        return database_url
-        
-    except requests.RequestException as e:
-        logger.error(f"Failed to download image for bundle {bundle_id}: {e}")
-        return None
-    except Exception as e:
-        logger.error(f"Failed to store image for bundle {bundle_id} in database: {e}")
-        db.rollback()
-        return None
+    results = await download_and_store_images({bundle_id: local_image_url}, db)
+    return results[bundle_id]
 
 
-def get_bundle_image_from_db(bundle_id: int, db: Session) -> Optional[BundleImage]:
+# Deletes a bundle's latest image and, unless another bundle still shares them, its bytes,
+# in one statement. The CTEs see the table as it was before the delete, so the reference
+# being removed is excluded explicitly.
+_DELETE_BUNDLE_IMAGE_STMT = text(
     """
-    Retrieve bundle image from database.
+    WITH gone AS (
+        DELETE FROM bundle_images
+        WHERE id = (SELECT id FROM bundle_images WHERE bundle_id = :bundle_id
+                    ORDER BY id DESC LIMIT 1)
+        RETURNING id, sha256
+    ), orphans AS (
+        DELETE FROM image_blobs b USING gone
+        WHERE b.sha256 = gone.sha256
+          AND NOT EXISTS (SELECT 1 FROM bundle_images i
+                          WHERE i.sha256 = gone.sha256 AND i.id <> gone.id)
+    )
+    SELECT count(*) FROM gone
+    """
+)
+
+
+def get_bundle_image_meta(bundle_id: str, db: Session):
+    """
+    Look up a bundle's latest image without loading its bytes.
+    
+    Returns:
+        Row of (sha256, file_size, content_type), or None if the bundle has no image
+    """
+    return (
+        db.query(BundleImage.sha256, BundleImage.file_size, BundleImage.content_type)
+        .filter(BundleImage.bundle_id == bundle_id)
+        .order_by(BundleImage.id.desc())
+        .first()
+    )
+
+
+def get_image_data(sha256: str, db: Session) -> Optional[bytes]:
+    """Return the bytes of a stored image by digest, or None if there is none."""
+    return db.query(ImageBlob.image_data).filter(ImageBlob.sha256 == sha256).scalar()
+
+
+def get_bundle_image_from_db(bundle_id: str, db: Session) -> Optional[BundleImage]:
+    """
+    Retrieve a bundle's latest image from database.
     
     Args:
         bundle_id: Bundle ID
@@ -97,12 +284,18 @@ def get_bundle_image_from_db(bundle_id: int, db: Session) -> Optional[BundleImag
     Returns:
         BundleImage object or None if not found
     """
-    return db.query(BundleImage).filter(BundleImage.bundle_id == bundle_id).first()
+    return (
+        db.query(BundleImage)
+        .options(joinedload(BundleImage.blob))
+        .filter(BundleImage.bundle_id == bundle_id)
+        .order_by(BundleImage.id.desc())
+        .first()
+    )
 
 
-def delete_bundle_image(bundle_id: int, db: Session) -> bool:
+def delete_bundle_image(bundle_id: str, db: Session) -> bool:
     """
-    Delete bundle image from database.
+    Delete a bundle's latest image from database.
     
     Args:
         bundle_id: Bundle ID
@@ -112,10 +305,11 @@ def delete_bundle_image(bundle_id: int, db: Session) -> bool:
         True if deleted, False if not found
     """
     try:
-        db_image = db.query(BundleImage).filter(BundleImage.bundle_id == bundle_id).first()
-        if db_image:
-            db.delete(db_image)
-            db.commit()
+        # One round trip for the delete and one for the commit, instead of a SELECT,
+        # two DELETEs and the commit
+        deleted = db.execute(_DELETE_BUNDLE_IMAGE_STMT, {"bundle_id": bundle_id}).scalar_one()
+        db.commit()
+        if deleted:
             logger.info(f"Deleted image for bundle {bundle_id}")
             return True
         return False
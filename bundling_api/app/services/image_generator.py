@@ -1,16 +1,23 @@
 import asyncio
+import hashlib
 import os
-import time
-from typing import List, Optional, Dict, Any
+import threading
+from contextlib import nullcontext
+from functools import lru_cache
+from types import MappingProxyType
+from typing import AsyncContextManager, List, NamedTuple, Optional, Dict, Any, Tuple
 import logging
 from datetime import datetime, timedelta
 
 import httpx
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 
-from ..config import settings
+from ..config import get_settings
 from ..models.bundle import Bundle
+from ..repositories.bundles import bundle_cache
 from ..schemas.bundle import ProductIn
+from ..utils.cache import TTLCache
 from .mock_image_generator import generate_realistic_mock_image, is_mock_mode_enabled
 
 logger = logging.getLogger(__name__)
@@ -21,19 +28,75 @@ class ImageGenerationError(Exception):
     pass
 
 
+# Pooled connections to the image server, shared by every generate/poll call. An httpx client
+# belongs to the event loop it first ran on, so there is one per loop: the app's (closed on
+# shutdown) and the sync wrappers' background loop below, which is only for callers outside
+# the app (scripts); request handlers await the async versions.
+_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the image server client for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = httpx.AsyncClient(
+            # Long read timeout for the generation calls; polling requests are quick
+            timeout=httpx.Timeout(10.0, read=150.0, write=10.0, connect=10.0),
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        )
+    return client
+
+
+async def close_image_api_client() -> None:
+    """Close the running loop's image server client (called on app shutdown)."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+_sync_loop: Optional[asyncio.AbstractEventLoop] = None
+_sync_loop_lock = threading.Lock()
+
+
+def _run_sync(coro):
+    """
+    Run a coroutine to completion from synchronous code.
+    
+    Every call goes to one long-lived event loop on a daemon thread, so consecutive calls
+    reuse its image server client and connections instead of building and tearing down
+    a loop (and a pool) each time. Must not be called from a running event loop.
+    """
+    global _sync_loop
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        coro.close()
+        raise RuntimeError("Called from a running event loop; await the async version instead")
+    
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, name="image-sync-loop", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _sync_loop).result()
+
+
 async def call_local_image_api(prompt: str) -> Optional[str]:
     """Call the local image generation API with the given prompt (sync version)"""
+    settings = get_settings()
     try:
-        async with httpx.AsyncClient(timeout=settings.image_generation_timeout) as client:
-            response = await client.post(
-                f"{settings.local_image_api_url}/generate-image",
-                json={"prompt": prompt},
-                headers={"Content-Type": "application/json"}
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            return result.get("image_url")
+        response = await get_client().post(
+            f"{settings.local_image_api_url}/generate-image",
+            json={"prompt": prompt},
+            headers={"Content-Type": "application/json"},
+            timeout=settings.image_generation_timeout,
+        )
+        response.raise_for_status()
+        
+        result = response.json()
+        return result.get("image_url")
             
     except httpx.TimeoutException:
         logger.error(f"Timeout calling local image API at {settings.local_image_api_url}")
@@ -46,65 +109,167 @@ async def call_local_image_api(prompt: str) -> Optional[str]:
         return None
 
 
+# Async job polling: total wait, then the sync fallback; delays double from initial to max
+JOB_MAX_WAIT = 120.0
+JOB_POLL_INITIAL_DELAY = 0.25
+JOB_POLL_MAX_DELAY = 2.0
+# Seconds the image server may hold a status request open until the job finishes
+# (servers without long-poll support answer at once and the backoff applies)
+JOB_LONG_POLL_WAIT = 10.0
+
+
+# Job submissions made within this many seconds of each other go out as one batch request
+JOB_SUBMIT_WINDOW = 0.01
+JOB_SUBMIT_MAX_BATCH = 16
+
+
+class _JobSubmitter:
+    """
+    Coalesces async job submissions from concurrent generations (a batch of bundles) into
+    one POST /generate-images-async per JOB_SUBMIT_WINDOW, instead of a request per prompt.
+    
+    Each submitter belongs to one event loop. Submissions resolve to a job ID, or None if the
+    batch request failed; once the server turns out not to have the batch endpoint, batching
+    is switched off and callers submit individually.
+    """
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.batching = True
+        self._loop = loop
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._sending: set = set()
+    
+    def submit(self, prompt: str) -> asyncio.Future:
+        future = self._loop.create_future()
+        self._pending.append((prompt, future))
+        if len(self._pending) >= JOB_SUBMIT_MAX_BATCH:
+            self._flush()
+        elif self._timer is None:
+            self._timer = self._loop.call_later(JOB_SUBMIT_WINDOW, self._flush)
+        return future
+    
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = self._loop.create_task(self._send(batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+    
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        job_ids: List[Optional[str]] = []
+        try:
+            response = await get_client().post(
+                f"{get_settings().local_image_api_url}/generate-images-async",
+                json={"requests": [{"prompt": prompt} for prompt, _ in batch]},
+            )
+            if response.status_code in (404, 405):
+                logger.info("Image server has no batch endpoint, submitting jobs individually")
+                self.batching = False
+            else:
+                response.raise_for_status()
+                ids = [job["job_id"] for job in response.json()]
+                if len(ids) != len(batch):
+                    raise ValueError(f"{len(ids)} job IDs returned for {len(batch)} prompts")
+                job_ids = ids
+                logger.info(f"Started {len(job_ids)} async image generation jobs in one request")
+        except Exception as e:
+            logger.warning(f"Batch job submission failed, submitting individually: {e}")
+        finally:
+            # Every caller is waiting on its future, so each is resolved even if this task is
+            # cancelled; None sends that caller to an individual submission
+            for i, (_, future) in enumerate(batch):
+                if not future.done():
+                    future.set_result(job_ids[i] if i < len(job_ids) else None)
+
+
+_submitters: Dict[asyncio.AbstractEventLoop, _JobSubmitter] = {}
+
+
+async def _submit_job(prompt: str) -> Optional[str]:
+    """Queue an async generation job on the image server; returns its ID, or None if refused."""
+    loop = asyncio.get_running_loop()
+    submitter = _submitters.get(loop)
+    if submitter is None:
+        submitter = _submitters[loop] = _JobSubmitter(loop)
+    if submitter.batching:
+        job_id = await submitter.submit(prompt)
+        if job_id is not None:
+            return job_id
+    
+    response = await get_client().post(
+        f"{get_settings().local_image_api_url}/generate-image-async",
+        json={"prompt": prompt},
+        headers={"Content-Type": "application/json"}
+    )
+    if response.status_code != 200:
+        return None
+    job_id = response.json()["job_id"]
+    logger.info(f"Started async image generation job: {job_id}")
+    return job_id
+
+
 async def call_local_image_api_async(prompt: str) -> Optional[Dict[str, Any]]:
     """Call the local image generation API with async job queue support"""
+    settings = get_settings()
     try:
-        # Create client with separate timeouts for different operations
-        timeout = httpx.Timeout(10.0, read=150.0, write=10.0, connect=10.0)  # 150s read timeout for polling
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            # First try async generation
-            response = await client.post(
-                f"{settings.local_image_api_url}/generate-image-async",
-                json={"prompt": prompt},
-                headers={"Content-Type": "application/json"}
-            )
+        client = get_client()
+        # First try async generation
+        job_id = await _submit_job(prompt)
+        
+        if job_id is not None:
+            # Poll for completion (with reasonable timeout), starting fast and backing off so
+            # quick jobs are noticed promptly without hammering the server on slow ones
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + JOB_MAX_WAIT
+            delay = JOB_POLL_INITIAL_DELAY
             
-            if response.status_code == 200:
-                job_data = response.json()
-                job_id = job_data["job_id"]
-                
-                logger.info(f"Started async image generation job: {job_id}")
-                
-                # Poll for completion (with reasonable timeout)
-                max_wait_time = 120  # 2 minutes max
-                start_time = time.time()
-                
-                while time.time() - start_time < max_wait_time:
-                    job_response = await client.get(f"{settings.local_image_api_url}/job/{job_id}")
-                    if job_response.status_code == 200:
-                        job_status = job_response.json()
-                        
-                        if job_status["status"] == "completed":
-                            logger.info(f"Async job {job_id} completed successfully")
-                            return {
-                                "image_url": job_status["image_url"],
-                                "generation_time": job_status.get("generation_time", 0),
-                                "method": "async"
-                            }
-                        elif job_status["status"] == "failed":
-                            logger.error(f"Async job {job_id} failed: {job_status.get('error')}")
-                            break
+            while loop.time() < deadline:
+                polled_at = loop.time()
+                wait = min(JOB_LONG_POLL_WAIT, deadline - polled_at)
+                job_response = await client.get(
+                    f"{settings.local_image_api_url}/job/{job_id}", params={"wait": wait}
+                )
+                if job_response.status_code == 200:
+                    job_status = job_response.json()
                     
-                    await asyncio.sleep(2)  # Wait 2 seconds before polling again
+                    if job_status["status"] == "completed":
+                        logger.info(f"Async job {job_id} completed successfully")
+                        return {
+                            "image_url": job_status["image_url"],
+                            "generation_time": job_status.get("generation_time", 0),
+                            "method": "async"
+                        }
+                    elif job_status["status"] == "failed":
+                        logger.error(f"Async job {job_id} failed: {job_status.get('error')}")
+                        break
                 
-                logger.warning(f"Async job {job_id} timed out, falling back to sync")
-            
-            # Fallback to sync generation
-            logger.info("Falling back to sync image generation")
-            response = await client.post(
-                f"{settings.local_image_api_url}/generate-image",
-                json={"prompt": prompt},
-                headers={"Content-Type": "application/json"}
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            return {
-                "image_url": result.get("image_url"),
-                "generation_time": result.get("generation_time", 0),
-                "method": "sync_fallback"
-            }
+                if loop.time() - polled_at < wait / 2:
+                    # Answered right away, so the server isn't long-polling: back off
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, JOB_POLL_MAX_DELAY)
             
+            logger.warning(f"Async job {job_id} timed out, falling back to sync")
+        
+        # Fallback to sync generation
+        logger.info("Falling back to sync image generation")
+        response = await client.post(
+            f"{settings.local_image_api_url}/generate-image",
+            json={"prompt": prompt},
+            headers={"Content-Type": "application/json"}
+        )
+        response.raise_for_status()
+        
+        result = response.json()
+        return {
+            "image_url": result.get("image_url"),
+            "generation_time": result.get("generation_time", 0),
+            "method": "sync_fallback"
+        }
+        
     except httpx.TimeoutException:
         logger.error(f"Timeout calling local image API at {settings.local_image_api_url}")
         return None
@@ -116,6 +281,22 @@ async def call_local_image_api_async(prompt: str) -> Optional[Dict[str, Any]]:
         return None
 
 
+# Punctuation stripped from word ends before judging word length
+_CLIP_PUNCTUATION = '.,;:!?"()[]'
+
+
+def _word_token_counts(text: str) -> List[int]:
+    """Estimated CLIP tokens for each whitespace-separated word of text, in order."""
+    counts = []
+    for word in text.split():
+        core = word.strip(_CLIP_PUNCTUATION)
+        length = len(core)
+        # Short and medium words ~1 token, longer ones often 2, very long ones 2-3;
+        # plus one token if punctuation was stripped
+        counts.append((1 if length <= 6 else 2 if length <= 10 else 3) + (core != word))
+    return counts
+
+
 def estimate_clip_tokens(text: str) -> int:
     """
     Estimate number of CLIP tokens for a given text.
@@ -132,39 +313,50 @@ def estimate_clip_tokens(text: str) -> int:
     # - Numbers and technical terms: often 1-2 tokens  
     # - Special characters and punctuation: variable
     # - Subwords: longer words may be split into multiple tokens
+    return sum(_word_token_counts(text))
+
+
+@lru_cache(maxsize=1)
+def get_clip_tokenizer():
+    """
+    Load the CLIP tokenizer named by CLIP_TOKENIZER once per process.
     
-    words = text.split()
-    estimated_tokens = 0
-    
-    for word in words:
-        # Strip punctuation for analysis
-        clean_word = word.strip('.,;:!?"()[]')
-        
-        if len(clean_word) <= 3:
-            # Short words: usually 1 token
-            estimated_tokens += 1
-        elif len(clean_word) <= 6:
-            # Medium words: usually 1 token, sometimes 2
-            estimated_tokens += 1
-        elif len(clean_word) <= 10:
-            # Longer words: often split into 2 tokens
-            estimated_tokens += 2  
-        else:
-            # Very long words: likely split into 2-3 tokens
-            estimated_tokens += 3
-            
-        # Add token for punctuation if present
-        if word != clean_word:
-            estimated_tokens += 1
-    
-    return estimated_tokens
+    Returns None (and the word-based estimate is used) when it is disabled, transformers
+    isn't installed, or the tokenizer can't be loaded. Called at startup so the one-time
+    load doesn't land on a request.
+    """
+    name = get_settings().clip_tokenizer
+    if not name:
+        return None
+    try:
+        from transformers import CLIPTokenizerFast
+        return CLIPTokenizerFast.from_pretrained(name)
+    except Exception as e:
+        logger.warning(f"CLIP tokenizer {name!r} unavailable, estimating prompt tokens instead: {e}")
+        return None
 
 
+def _truncate_with_tokenizer(tokenizer, prompt: str, max_tokens: int) -> str:
+    encoding = tokenizer(prompt, add_special_tokens=False, return_offsets_mapping=True)
+    offsets = encoding["offset_mapping"]
+    if len(offsets) <= max_tokens:
+        return prompt
+    # Cut the original text after the last token that fits, leaving one token for the final "."
+    end = offsets[max(max_tokens - 2, 0)][1]
+    result = prompt[:end].rstrip(' .,;:') + "."
+    logger.warning(f"Prompt truncated from {len(offsets)} to {max_tokens} CLIP tokens")
+    return result
+
+
+@lru_cache(maxsize=2048)
 def truncate_prompt_for_clip(prompt: str, max_tokens: int = 73) -> str:
     """
     Truncate prompt to fit within CLIP's token limit.
     Uses conservative limit of 73 tokens (4 token safety buffer).
     
+    Token counts are exact when the CLIP tokenizer is available; otherwise they are
+    estimated per word and the prompt is shortened word by word.
+    
     Args:
         prompt: Original prompt string
         max_tokens: Maximum number of tokens (default 73 for safety)
@@ -172,17 +364,22 @@ def truncate_prompt_for_clip(prompt: str, max_tokens: int = 73) -> str:
     Returns:
         Truncated prompt that fits within token limit
     """
-    estimated_tokens = estimate_clip_tokens(prompt)
+    tokenizer = get_clip_tokenizer()
+    if tokenizer is not None:
+        return _truncate_with_tokenizer(tokenizer, prompt, max_tokens)
+    
+    words = prompt.split()
+    # The estimate is a per-word sum, so dropping a word just subtracts its share
+    word_tokens = _word_token_counts(prompt)
+    estimated_tokens = sum(word_tokens)
     
     if estimated_tokens <= max_tokens:
         return prompt
     
     # If over limit, progressively remove words from the end
-    words = prompt.split()
     while estimated_tokens > max_tokens and len(words) > 5:  # Keep at least 5 words
         words.pop()  # Remove last word
-        truncated = " ".join(words)
-        estimated_tokens = estimate_clip_tokens(truncated)
+        estimated_tokens -= word_tokens.pop()
     
     # Ensure proper ending
     result = " ".join(words).rstrip('.,;:') + "."
@@ -193,6 +390,63 @@ def truncate_prompt_for_clip(prompt: str, max_tokens: int = 73) -> str:
     return result
 
 
+# Styling per product category, and the order in which categories win when a bundle mixes them
+_CATEGORY_STYLES = MappingProxyType({name: MappingProxyType(style) for name, style in {
+    'electronics': {
+        'style': 'sleek tech product photography',
+        'background': 'clean white background',
+        'lighting': 'bright professional lighting',
+        'composition': 'arranged on modern surface',
+        'quality': 'premium quality, sharp focus'
+    },
+    'food': {
+        'style': 'appetizing food photography',
+        'background': 'neutral background',
+        'lighting': 'warm natural lighting',
+        'composition': 'artfully arranged',
+        'quality': 'fresh, vibrant colors'
+    },
+    'beverage': {
+        'style': 'beverage product photography',
+        'background': 'clean background',
+        'lighting': 'crisp lighting with highlights',
+        'composition': 'elegantly positioned',
+        'quality': 'refreshing, condensation details'
+    },
+    'clothing': {
+        'style': 'fashion product photography',
+        'background': 'neutral backdrop',
+        'lighting': 'soft diffused lighting',
+        'composition': 'stylishly displayed',
+        'quality': 'texture details, fabric quality'
+    },
+    'beauty': {
+        'style': 'beauty product photography',
+        'background': 'pristine white background',
+        'lighting': 'even professional lighting',
+        'composition': 'aesthetically arranged',
+        'quality': 'luxurious, detailed textures'
+    },
+    'home': {
+        'style': 'lifestyle product photography',
+        'background': 'clean modern background',
+        'lighting': 'natural warm lighting',
+        'composition': 'thoughtfully arranged',
+        'quality': 'cozy, inviting atmosphere'
+    }
+}.items()})
+_GENERAL_STYLE = MappingProxyType({
+    'style': 'professional product photography',
+    'background': 'clean white background',
+    'lighting': 'professional lighting',
+    'composition': 'neatly arranged',
+    'quality': 'high quality, detailed'
+})
+_PREMIUM_TAGS = frozenset({'premium', 'luxury', 'pro', 'max', 'ultra', 'flagship'})
+_PHONE_TAGS = frozenset({'smartphone', 'phone'})
+_CATEGORY_PRIORITY = ('electronics', 'food', 'beverage', 'clothing', 'beauty', 'home')
+
+
 def get_product_category_keywords(products: List[ProductIn]) -> Dict[str, Any]:
     """
     Analyze products and return category-specific keywords and styling.
@@ -202,94 +456,32 @@ def get_product_category_keywords(products: List[ProductIn]) -> Dict[str, Any]:
         
     Returns:
         Dictionary with category info, styling keywords, and composition hints
+        (style_info may be a shared read-only mapping; copy it before changing it)
     """
     # Extract product types and tags
-    categories = set()
-    all_tags = set()
-    
-    for product in products:
-        if product.product_type:
-            categories.add(product.product_type.lower())
-        if product.tags:
-            all_tags.update([tag.lower() for tag in product.tags if tag])
-    
-    # Determine primary category and styling
-    category_styles = {
-        'electronics': {
-            'style': 'sleek tech product photography',
-            'background': 'clean white background',
-            'lighting': 'bright professional lighting',
-            'composition': 'arranged on modern surface',
-            'quality': 'premium quality, sharp focus'
-        },
-        'food': {
-            'style': 'appetizing food photography',
-            'background': 'neutral background',
-            'lighting': 'warm natural lighting',
-            'composition': 'artfully arranged',
-            'quality': 'fresh, vibrant colors'
-        },
-        'beverage': {
-            'style': 'beverage product photography',
-            'background': 'clean background',
-            'lighting': 'crisp lighting with highlights',
-            'composition': 'elegantly positioned',
-            'quality': 'refreshing, condensation details'
-        },
-        'clothing': {
-            'style': 'fashion product photography',
-            'background': 'neutral backdrop',
-            'lighting': 'soft diffused lighting',
-            'composition': 'stylishly displayed',
-            'quality': 'texture details, fabric quality'
-        },
-        'beauty': {
-            'style': 'beauty product photography',
-            'background': 'pristine white background',
-            'lighting': 'even professional lighting',
-            'composition': 'aesthetically arranged',
-            'quality': 'luxurious, detailed textures'
-        },
-        'home': {
-            'style': 'lifestyle product photography',
-            'background': 'clean modern background',
-            'lighting': 'natural warm lighting',
-            'composition': 'thoughtfully arranged',
-            'quality': 'cozy, inviting atmosphere'
-        }
-    }
+    categories = {p.product_type.lower() for p in products if p.product_type}
+    all_tags = {tag.lower() for p in products if p.tags for tag in p.tags if tag}
     
-    # Determine primary category
-    primary_category = 'general'
-    for category in ['electronics', 'food', 'beverage', 'clothing', 'beauty', 'home']:
-        if any(cat in categories for cat in [category]):
-            primary_category = category
-            break
+    # Determine primary category (first match in priority order)
+    primary_category = next((c for c in _CATEGORY_PRIORITY if c in categories), 'general')
     
     # Check for mixed categories (different styling needed)
     is_mixed = len(categories) > 1 and primary_category != 'general'
     
-    # Get styling for category
-    if primary_category in category_styles:
-        style_info = category_styles[primary_category].copy()
-    else:
-        style_info = {
-            'style': 'professional product photography',
-            'background': 'clean white background',
-            'lighting': 'professional lighting',
-            'composition': 'neatly arranged',
-            'quality': 'high quality, detailed'
-        }
+    # Get styling for category; the shared read-only style is only copied when adjusted
+    style_info = _CATEGORY_STYLES.get(primary_category, _GENERAL_STYLE)
     
     # Adjust for mixed categories
     if is_mixed:
-        style_info['style'] = 'diverse product photography'
-        style_info['composition'] = 'harmoniously arranged together'
+        style_info = {
+            **style_info,
+            'style': 'diverse product photography',
+            'composition': 'harmoniously arranged together',
+        }
     
     # Add premium modifiers for high-value items
-    premium_tags = {'premium', 'luxury', 'pro', 'max', 'ultra', 'flagship'}
-    if all_tags.intersection(premium_tags):
-        style_info['quality'] = 'premium quality, ' + style_info['quality']
+    if not all_tags.isdisjoint(_PREMIUM_TAGS):
+        style_info = {**style_info, 'quality': 'premium quality, ' + style_info['quality']}
     
     return {
         'primary_category': primary_category,
@@ -300,6 +492,15 @@ def get_product_category_keywords(products: List[ProductIn]) -> Dict[str, Any]:
     }
 
 
+# Common noise words that don't help image generation
+_NOISE_WORDS = frozenset({
+    'pack', 'bundle', 'set', 'combo', 'deal', 'special', 'limited',
+    'edition', 'version', 'model', 'brand', 'new', 'original'
+})
+
+
+# Product names recur across bundles with different product sets, which miss the prompt cache
+@lru_cache(maxsize=4096)
 def clean_product_name(name: str) -> str:
     """
     Clean product name for better prompt generation.
@@ -313,19 +514,13 @@ def clean_product_name(name: str) -> str:
     if not name:
         return "product"
     
-    # Remove common noise words that don't help image generation
-    noise_words = {
-        'pack', 'bundle', 'set', 'combo', 'deal', 'special', 'limited',
-        'edition', 'version', 'model', 'brand', 'new', 'original'
-    }
-    
     # Clean and split
     words = name.lower().split()
     cleaned_words = []
     
     for word in words:
         # Remove noise words but keep important descriptors
-        if word not in noise_words and len(word) > 1:
+        if word not in _NOISE_WORDS and len(word) > 1:
             cleaned_words.append(word)
     
     # Keep original if cleaning removed too much
@@ -351,15 +546,51 @@ def build_bundle_prompt(bundle_name: str, products: List[ProductIn], description
     if not products:
         return "products, professional photography, white background, high quality"
     
+    # Only these product fields shape the prompt (the bundle name and description don't),
+    # so retries and re-generations for the same products are served from the cache
+    return _build_prompt_for_products(tuple(
+        p if isinstance(p, _PromptProduct) else _PromptProduct(p.name, p.product_type, tuple(p.tags or ()))
+        for p in products
+    ))
+
+
+class _PromptProduct(NamedTuple):
+    """The hashable subset of ProductIn that build_bundle_prompt uses."""
+    name: str
+    product_type: Optional[str]
+    tags: Tuple[str, ...]
+
+
+def _prompt_products(raw: Any) -> List[_PromptProduct]:
+    """
+    The prompt inputs of a stored bundle's products JSONB.
+    
+    Image generation only reads name, product_type and tags, so the dicts are picked
+    apart directly instead of each being validated into a full ProductIn.
+    Entries without a name are skipped.
+    """
+    if not isinstance(raw, list):
+        return []
+    return [
+        _PromptProduct(
+            str(p["name"]),
+            p.get("product_type"),
+            tuple(map(str, p["tags"])) if isinstance(p.get("tags"), list) else (),
+        )
+        for p in raw
+        if isinstance(p, dict) and p.get("name")
+    ]
+
+
+@lru_cache(maxsize=2048)
+def _build_prompt_for_products(products: Tuple[_PromptProduct, ...]) -> str:
     # Analyze products for context-aware generation
     context = get_product_category_keywords(products)
     
     # Clean and select best product names (limit to 3-4 for clarity)
-    cleaned_names = []
-    for product in products[:4]:
-        cleaned_name = clean_product_name(product.name)
-        if cleaned_name and cleaned_name not in cleaned_names:
-            cleaned_names.append(cleaned_name)
+    cleaned_names = list(dict.fromkeys(
+        cleaned_name for product in products[:4] if (cleaned_name := clean_product_name(product.name))
+    ))
     
     if not cleaned_names:
         cleaned_names = ["products"]
@@ -378,55 +609,65 @@ def build_bundle_prompt(bundle_name: str, products: List[ProductIn], description
         main_subject = f"{', '.join(cleaned_names[:-1])}, and {cleaned_names[-1]} all together"
         composition_emphasis = "all products prominently displayed together"
     
-    # Get style components and enhance composition for multiple products
+    # Get style components (multiple products use composition_emphasis for visibility)
     style_info = context['style_info']
-    
-    # Override composition for multiple products to ensure visibility
-    if len(cleaned_names) > 1:
-        if context['primary_category'] == 'electronics':
-            style_info['composition'] = "arranged side by side on modern surface"
-        elif context['primary_category'] == 'food':
-            style_info['composition'] = "arranged together in appealing layout"
-        else:
-            style_info['composition'] = "arranged together prominently"
-    
-    # Build prompt components with explicit product visibility
-    prompt_parts = [
-        main_subject,
-        style_info['style'],
-        composition_emphasis if len(cleaned_names) > 1 else style_info['composition'],
-        style_info['background'],
-        style_info['lighting'],
-        style_info['quality']
-    ]
-    
-    # Join with natural flow
-    prompt = ", ".join(prompt_parts)
+    composition = composition_emphasis if len(cleaned_names) > 1 else style_info['composition']
     
     # Add category-specific enhancements with multi-product emphasis
+    is_phone = context['primary_category'] == 'electronics' and not context['tags'].isdisjoint(_PHONE_TAGS)
     if len(products) > 1:
         # Always emphasize multiple products being shown together
-        prompt += ", showing all items clearly"
-        
-        if context['primary_category'] == 'electronics' and context['tags'].intersection({'smartphone', 'phone'}):
-            prompt += ", each device fully visible, premium materials"
+        if is_phone:
+            enhancements = ", showing all items clearly, each device fully visible, premium materials"
         elif context['primary_category'] == 'food':
-            prompt += ", appetizing presentation, each item distinct"
+            enhancements = ", showing all items clearly, appetizing presentation, each item distinct"
         elif context['is_mixed']:
-            prompt += ", cohesive styling, each product prominently featured"
+            enhancements = ", showing all items clearly, cohesive styling, each product prominently featured"
         else:
-            prompt += ", balanced composition, no overlapping products"
+            enhancements = ", showing all items clearly, balanced composition, no overlapping products"
+    elif is_phone:
+        enhancements = ", screen reflections, premium materials"
+    elif context['primary_category'] == 'food':
+        enhancements = ", appetizing presentation"
     else:
-        # Single product enhancements
-        if context['primary_category'] == 'electronics' and context['tags'].intersection({'smartphone', 'phone'}):
-            prompt += ", screen reflections, premium materials"
-        elif context['primary_category'] == 'food':
-            prompt += ", appetizing presentation"
+        enhancements = ""
+    
+    # Assemble the prompt with explicit product visibility in one pass
+    prompt = (
+        f"{main_subject}, {style_info['style']}, {composition}, {style_info['background']}, "
+        f"{style_info['lighting']}, {style_info['quality']}{enhancements}"
+    )
     
     # Keep it under token limit with smart truncation
     return truncate_prompt_for_clip(prompt, max_tokens=55)  # Slightly higher for enhanced prompts
 
 
+# Image URLs by sha256 of the prompt: identical product sets build identical prompts, so these
+# skip the diffusion call entirely. Concurrent misses for one prompt share a single generation.
+_generated_images = TTLCache(ttl=get_settings().image_prompt_cache_ttl, maxsize=512)
+_generations_in_flight: Dict[Tuple[bytes], asyncio.Future] = {}
+
+
+async def _generate_for_prompt(prompt: str) -> Optional[Dict[str, Any]]:
+    """call_local_image_api_async, reusing a recent or in-flight result for the same prompt."""
+    key = (hashlib.sha256(prompt.encode("utf-8")).digest(),)
+    cached = _generated_images.get(key)
+    if cached is not None:
+        return cached
+    
+    task = _generations_in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(call_local_image_api_async(prompt))
+        _generations_in_flight[key] = task
+        task.add_done_callback(lambda _: _generations_in_flight.pop(key, None))
+    
+    # Shielded so one caller going away doesn't cancel the generation the others are waiting on
+    result = await asyncio.shield(task)
+    if result and result.get("image_url"):
+        _generated_images.set(key, result)
+    return result
+
+
 async def generate_bundle_image(bundle_name: str, products: List[ProductIn], description: Optional[str] = None) -> str:
     """
     Generate a single image for a bundle using local diffusers API.
@@ -458,7 +699,7 @@ async def generate_bundle_image(bundle_name: str, products: List[ProductIn], des
         logger.info(f"Prompt: {prompt[:150]}...")
         
         # Call local image generation API with async support
-        result = await call_local_image_api_async(prompt)
+        result = await _generate_for_prompt(prompt)
         
         if not result or not result.get("image_url"):
             raise ImageGenerationError(f"Local image API returned no image URL for bundle '{bundle_name}'")
@@ -488,16 +729,96 @@ def generate_bundle_image_sync(bundle_name: str, products: List[ProductIn], desc
     """
     Synchronous wrapper for generate_bundle_image.
     """
-    return asyncio.run(generate_bundle_image(bundle_name, products, description))
+    return _run_sync(generate_bundle_image(bundle_name, products, description))
+
+
+# Upper bounds on one bundle's generation (counted from when it holds a slot, not while it
+# queues for one) and on its upload, so a hung upstream job or upload costs that bundle its
+# image (or its R2 copy) rather than holding up the whole batch response
+BUNDLE_IMAGE_TIMEOUT = 180.0
+BUNDLE_UPLOAD_TIMEOUT = 60.0
+
+
+async def _generate_single_bundle_image(
+    bundle: Bundle, slot: AsyncContextManager = nullcontext()
+) -> Optional[str]:
+    """
+    Generate (and upload) the image for one bundle; returns its URL, or None on failure.
+    
+    Only the generation runs inside `slot` (the batch's concurrency limit), so the R2
+    upload overlaps with the next bundle's generation instead of holding its place.
+    """
+    try:
+        products = _prompt_products(bundle.products)
+        if not products:
+            logger.warning(f"Bundle {bundle.id} has no valid products for image generation")
+            return None
+            
+        # Generate image using async function; the deadline starts once the slot is ours
+        async with slot:
+            try:
+                async with asyncio.timeout(BUNDLE_IMAGE_TIMEOUT):
+                    image_url = await generate_bundle_image(
+                        bundle.name, 
+                        products, 
+                        bundle.description
+                    )
+            except TimeoutError:
+                logger.error(f"Image generation for bundle {bundle.id} timed out after {BUNDLE_IMAGE_TIMEOUT:.0f}s")
+                return None
+        
+        # Upload to R2 if we got a local URL
+        if image_url and (image_url.startswith("http://localhost:8001/images/") or image_url.startswith("https://image.huggle.tech/images/")):
+            try:
+                from .r2_image_upload import upload_bundle_image
+                # The upload is blocking (requests + boto3); keep it off the event loop. On
+                # timeout the thread finishes in the background and the proxy URL is used.
+                async with asyncio.timeout(BUNDLE_UPLOAD_TIMEOUT):
+                    r2_url = await asyncio.to_thread(upload_bundle_image, image_url, bundle.id)
+                
+                if r2_url and r2_url != image_url:  # R2 upload succeeded
+                    logger.info(f"Bundle {bundle.id}: R2 upload successful: {r2_url}")
+                    image_url = r2_url
+                else:
+                    # Fallback to proxy URL
+                    filename = image_url.split('/')[-1]
+                    image_url = f"/api/images/generated/{filename}"
+                    logger.info(f"Bundle {bundle.id}: Using proxy URL: {image_url}")
+                    
+            except Exception as e:
+                logger.error(f"Bundle {bundle.id}: R2 upload failed: {e!r}")
+                filename = image_url.split('/')[-1]
+                image_url = f"/api/images/generated/{filename}"
+        
+        return image_url
+        
+    except Exception as e:
+        logger.error(f"Failed to generate image for bundle {bundle.id}: {str(e)}")
+        return None
+
 
+async def _generate_into(
+    bundle: Bundle, slot: AsyncContextManager, results: Dict[str, Optional[str]]
+) -> None:
+    results[bundle.id] = await _generate_single_bundle_image(bundle, slot)
 
-def generate_images_for_bundles(bundles: List[Bundle], max_concurrent: int = 3) -> Dict[int, Optional[str]]:
+
+async def generate_images_for_bundles_async(
+    bundles: List[Bundle], max_concurrent: Optional[int] = None
+) -> Dict[str, Optional[str]]:
     """
-    Generate images for multiple bundles using local diffusers API.
+    Generate images for multiple bundles concurrently on the running event loop.
+    
+    Each bundle gets BUNDLE_IMAGE_TIMEOUT seconds of generation once it starts (time spent
+    waiting for a concurrency slot doesn't count); one that runs over is cancelled (closing
+    its upstream requests) and reported as failed. Its upload then gets BUNDLE_UPLOAD_TIMEOUT
+    seconds before the proxy URL is used instead. If the caller is cancelled, the task group
+    cancels every generation still running.
     
     Args:
         bundles: List of Bundle objects to generate images for
         max_concurrent: Maximum number of concurrent image generations
+            (defaults to the IMAGE_CONCURRENCY setting)
         
     Returns:
         Dictionary mapping bundle IDs to image URLs (or None if generation failed)
@@ -506,72 +827,27 @@ def generate_images_for_bundles(bundles: List[Bundle], max_concurrent: int = 3)
         logger.warning("No bundles provided for image generation")
         return {}
     
-    async def generate_single_bundle_image(bundle: Bundle) -> tuple[int, Optional[str]]:
-        """Generate image for a single bundle (async)"""
-        try:
-            # Convert products JSONB to ProductIn objects
-            products = []
-            if isinstance(bundle.products, list):
-                for product_data in bundle.products:
-                    if isinstance(product_data, dict):
-                        products.append(ProductIn(**product_data))
-                    
-            if not products:
-                logger.warning(f"Bundle {bundle.id} has no valid products for image generation")
-                return bundle.id, None
-                
-            # Generate image using async function
-            image_url = await generate_bundle_image(
-                bundle.name, 
-                products, 
-                bundle.description
-            )
-            
-            # Upload to R2 if we got a local URL
-            if image_url and (image_url.startswith("http://localhost:8001/images/") or image_url.startswith("https://image.huggle.tech/images/")):
-                try:
-                    from .r2_image_upload import upload_bundle_image
-                    r2_url = upload_bundle_image(image_url, bundle.id)
-                    
-                    if r2_url and r2_url != image_url:  # R2 upload succeeded
-                        logger.info(f"Bundle {bundle.id}: R2 upload successful: {r2_url}")
-                        image_url = r2_url
-                    else:
-                        # Fallback to proxy URL
-                        filename = image_url.split('/')[-1]
-                        image_url = f"/api/images/generated/{filename}"
-                        logger.info(f"Bundle {bundle.id}: Using proxy URL: {image_url}")
-                        
-                except Exception as e:
-                    logger.error(f"Bundle {bundle.id}: R2 upload failed: {e}")
-                    filename = image_url.split('/')[-1]
-                    image_url = f"/api/images/generated/{filename}"
-            
-            return bundle.id, image_url
-            
-        except Exception as e:
-            logger.error(f"Failed to generate image for bundle {bundle.id}: {str(e)}")
-            return bundle.id, None
+    limit = max_concurrent or get_settings().image_concurrency
+    # If everything fits under the cap, all generations start at once
+    slot = nullcontext() if len(bundles) <= limit else asyncio.Semaphore(limit)
     
-    async def generate_all_images():
-        """Generate images for all bundles with concurrency control"""
-        semaphore = asyncio.Semaphore(max_concurrent)
-        
-        async def generate_with_semaphore(bundle: Bundle):
-            async with semaphore:
-                return await generate_single_bundle_image(bundle)
-        
-        tasks = [generate_with_semaphore(bundle) for bundle in bundles]
-        results = await asyncio.gather(*tasks)
-        
-        return dict(results)
-    
-    # Run the async image generation
+    # Every bundle starts out failed; each task fills in its own entry as it finishes
+    results: Dict[str, Optional[str]] = dict.fromkeys(bundle.id for bundle in bundles)
     try:
-        return asyncio.run(generate_all_images())
+        async with asyncio.TaskGroup() as tg:
+            for bundle in bundles:
+                tg.create_task(_generate_into(bundle, slot, results))
     except Exception as e:
         logger.error(f"Batch image generation failed: {str(e)}")
         return {}
+    return results
+
+
+def generate_images_for_bundles(bundles: List[Bundle], max_concurrent: Optional[int] = None) -> Dict[str, Optional[str]]:
+    """
+    Synchronous wrapper for generate_images_for_bundles_async, for callers without an event loop.
+    """
+    return _run_sync(generate_images_for_bundles_async(bundles, max_concurrent))
 
 
 def update_bundle_with_image(db: Session, bundle_id: int, image_url: str) -> bool:
@@ -587,13 +863,21 @@ def update_bundle_with_image(db: Session, bundle_id: int, image_url: str) -> boo
         True if update was successful, False otherwise
     """
     try:
-        bundle = db.query(Bundle).filter(Bundle.id == bundle_id).first()
-        if not bundle:
+        # A single UPDATE ... RETURNING rather than loading the row first: one round trip
+        # plus the commit
+        store_id = db.execute(
+            update(Bundle)
+            .where(Bundle.id == bundle_id)
+            .values(image_url=image_url)
+            .returning(Bundle.store_id)
+        ).scalar_one_or_none()
+        if store_id is None:
+            db.rollback()
             logger.error(f"Bundle {bundle_id} not found for image update")
             return False
             
-        bundle.image_url = image_url
         db.commit()
+        bundle_cache.invalidate(store_id)
         
         logger.info(f"Updated bundle {bundle_id} with image URL: {image_url}")
         return True
@@ -604,7 +888,7 @@ def update_bundle_with_image(db: Session, bundle_id: int, image_url: str) -> boo
         return False
 
 
-def generate_and_update_bundle_image(db: Session, bundle_id: int) -> Optional[str]:
+async def generate_and_update_bundle_image(db: Session, bundle_id: int) -> Optional[str]:
     """
     Generate an image for a bundle and update the database record.
     
@@ -615,35 +899,25 @@ def generate_and_update_bundle_image(db: Session, bundle_id: int) -> Optional[st
     Returns:
         Image URL if successful, None if failed
     """
-    async def _async_generate_and_update():
-        try:
-            # Get the bundle
-            bundle = db.query(Bundle).filter(Bundle.id == bundle_id).first()
-            if not bundle:
-                raise ImageGenerationError(f"Bundle {bundle_id} not found")
-                
-            # Convert products to ProductIn objects
-            products = []
-            if isinstance(bundle.products, list):
-                for product_data in bundle.products:
-                    if isinstance(product_data, dict):
-                        products.append(ProductIn(**product_data))
+    try:
+        # Get the bundle (the session is blocking, so its calls run in a worker thread)
+        bundle = await asyncio.to_thread(db.get, Bundle, bundle_id)
+        if not bundle:
+            raise ImageGenerationError(f"Bundle {bundle_id} not found")
             
-            if not products:
-                raise ImageGenerationError(f"Bundle {bundle_id} has no valid products")
-                
-            # Generate the image
-            image_url = await generate_bundle_image(bundle.name, products, bundle.description)
+        products = _prompt_products(bundle.products)
+        if not products:
+            raise ImageGenerationError(f"Bundle {bundle_id} has no valid products")
             
-            # Update the bundle
-            if update_bundle_with_image(db, bundle_id, image_url):
-                return image_url
-            else:
-                return None
-                
-        except Exception as e:
-            logger.error(f"Failed to generate and update image for bundle {bundle_id}: {str(e)}")
+        # Generate the image
+        image_url = await generate_bundle_image(bundle.name, products, bundle.description)
+        
+        # Update the bundle
+        if await asyncio.to_thread(update_bundle_with_image, db, bundle_id, image_url):
+            return image_url
+        else:
             return None
-    
-    # Run the async function
-    return asyncio.run(_async_generate_and_update())
+            
+    except Exception as e:
+        logger.error(f"Failed to generate and update image for bundle {bundle_id}: {str(e)}")
+        return None
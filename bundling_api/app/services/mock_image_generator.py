@@ -6,7 +6,9 @@ but don't require any external API calls or credits. Perfect for testing and dev
 """
 
 import hashlib
-from typing import List, Optional
+import os
+from functools import lru_cache
+from typing import List, Optional, Tuple
 from urllib.parse import quote
 
 from ..schemas.bundle import ProductIn
@@ -24,15 +26,21 @@ def generate_mock_bundle_image(bundle_name: str, products: List[ProductIn], desc
     Returns:
         URL of a placeholder image that looks professional
     """
+    return _mock_bundle_image_url(bundle_name, tuple(p.name for p in products), description)
+
+
+# The URLs are pure functions of the names, so repeated renders of a bundle are a lookup
+@lru_cache(maxsize=2048)
+def _mock_bundle_image_url(bundle_name: str, product_names: Tuple[str, ...], description: Optional[str]) -> str:
     # Create a deterministic hash based on bundle content so the same bundle always gets the same image
-    content = f"{bundle_name}_{len(products)}"
-    if products:
-        content += "_" + "_".join(sorted([p.name for p in products]))
+    content = f"{bundle_name}_{len(product_names)}"
+    if product_names:
+        content += "_" + "_".join(sorted(product_names))
     if description:
         content += f"_{description[:50]}"
         
-    # Create a hash for consistency
-    content_hash = hashlib.md5(content.encode()).hexdigest()[:8]
+    # Create a hash for consistency (a fingerprint only, so the fast BLAKE2b rather than MD5)
+    content_hash = hashlib.blake2b(content.encode(), digest_size=4).hexdigest()
     
     # Use a placeholder service that creates realistic product images
     # This service allows custom text and colors
@@ -42,7 +50,7 @@ def generate_mock_bundle_image(bundle_name: str, products: List[ProductIn], desc
     text_color = "2c3e50"        # Dark blue-gray
     
     # Create the text to display
-    product_count = len(products)
+    product_count = len(product_names)
     text_lines = [
         bundle_name,
         f"{product_count} Products",
@@ -50,8 +58,8 @@ def generate_mock_bundle_image(bundle_name: str, products: List[ProductIn], desc
     ]
     
     # Add product names if they fit
-    if products and len(products) <= 3:
-        text_lines.extend([p.name[:20] for p in products[:3]])
+    if product_names and len(product_names) <= 3:
+        text_lines.extend([name[:20] for name in product_names[:3]])
     
     # URL encode the text
     text = quote("\\n".join(text_lines))
@@ -68,12 +76,17 @@ def generate_realistic_mock_image(bundle_name: str, products: List[ProductIn], d
     
     This creates URLs that look like they came from a real image generation service.
     """
+    return _realistic_mock_image_url(bundle_name, tuple(sorted(p.name for p in products)))
+
+
+@lru_cache(maxsize=2048)
+def _realistic_mock_image_url(bundle_name: str, sorted_names: Tuple[str, ...]) -> str:
     # Create a deterministic hash
-    content = f"{bundle_name}_{len(products)}"
-    if products:
-        content += "_" + "_".join(sorted([p.name for p in products]))
+    content = f"{bundle_name}_{len(sorted_names)}"
+    if sorted_names:
+        content += "_" + "_".join(sorted_names)
     
-    content_hash = hashlib.md5(content.encode()).hexdigest()
+    content_hash = hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
     
     # Create a realistic looking URL that mimics Replicate/other services
     mock_url = f"https://replicate.delivery/pbxt/mock-{content_hash[:16]}/{content_hash}.webp"
@@ -81,11 +94,13 @@ def generate_realistic_mock_image(bundle_name: str, products: List[ProductIn], d
     return mock_url
 
 
+@lru_cache(maxsize=1)
 def is_mock_mode_enabled() -> bool:
     """
     Check if we should use mock image generation instead of real API calls.
     
-    This can be controlled via environment variable or config.
+    This can be controlled via environment variable or config. It is read once, on the
+    first image generation; call is_mock_mode_enabled.cache_clear() after changing
+    USE_MOCK_IMAGES at runtime.
     """
-    import os
     return os.getenv("USE_MOCK_IMAGES", "false").lower() in ("true", "1", "yes")
\ No newline at end of file
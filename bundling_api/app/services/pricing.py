@@ -9,7 +9,6 @@ Handles pricing calculations for bundles, including:
 
 import logging
 from typing import List, Dict, Optional
-from decimal import Decimal, ROUND_HALF_UP
 from ..schemas.bundle import ProductIn, BundleCreate
 
 logger = logging.getLogger(__name__)
@@ -34,6 +33,14 @@ class BundlePricingCalculator:
             custom_discounts: Custom discount percentages by bundle size
         """
         self.discount_rates = custom_discounts or self.DEFAULT_DISCOUNTS
+        
+        # Discount by product count up to the largest size with its own rate, then one
+        # trailing entry (the 5+ item discount) for every bundle larger than that
+        five_plus = self.discount_rates.get(5, 0.0)
+        self._discount_lut = tuple(
+            0.0 if count < 2 else self.discount_rates.get(count, five_plus if count >= 5 else 0.0)
+            for count in range(max(5, *self.discount_rates) + 1)
+        ) + (five_plus,)
     
     def calculate_total_price(self, products: List[ProductIn]) -> float:
         """Calculate total price from individual product prices."""
@@ -49,36 +56,27 @@ class BundlePricingCalculator:
         Returns:
             Discount percentage (0-100)
         """
-        product_count = len(products)
-        
-        if product_count < 2:
-            return 0.0
-        
-        # Get discount for exact count, or use highest discount for 5+ items
-        if product_count in self.discount_rates:
-            return self.discount_rates[product_count]
-        elif product_count >= 5:
-            return self.discount_rates[5]
-        else:
-            return 0.0
+        # Exact count, or the 5+ item discount beyond the largest configured size
+        lut = self._discount_lut
+        return lut[min(len(products), len(lut) - 1)]
     
     def calculate_discounted_price(self, total_price: float, discount_percentage: float) -> float:
-        """Calculate discounted price with proper rounding."""
+        """
+        Calculate discounted price with proper rounding (half up, to the cent).
+        
+        Money is handled as integer cents and the discount as basis points, so a float total
+        like 1300.9499999999998 is priced as the 1300.95 it stands for.
+        """
         if discount_percentage <= 0:
             return total_price
-            
-        discount_decimal = Decimal(str(discount_percentage)) / Decimal('100')
-        price_decimal = Decimal(str(total_price))
-        
-        discounted = price_decimal * (Decimal('1') - discount_decimal)
         
-        # Round to 2 decimal places
-        return float(discounted.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+        total_cents = round(total_price * 100)
+        discount_bp = round(discount_percentage * 100)
+        return (total_cents * (10000 - discount_bp) + 5000) // 10000 / 100
     
     def calculate_savings_amount(self, total_price: float, discounted_price: float) -> float:
-        """Calculate savings amount."""
-        savings = Decimal(str(total_price)) - Decimal(str(discounted_price))
-        return float(savings.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+        """Calculate savings amount (in whole cents)."""
+        return (round(total_price * 100) - round(discounted_price * 100)) / 100
     
     def calculate_bundle_pricing(self, products: List[ProductIn]) -> Dict[str, Optional[float]]:
         """
@@ -139,6 +137,10 @@ class BundlePricingCalculator:
             }
 
 
+# Shared by every bundle priced with the default discounts (e.g. each row of a bulk create)
+_default_calculator = BundlePricingCalculator()
+
+
 def calculate_bundle_pricing(products: List[ProductIn], custom_discounts: Optional[Dict[int, float]] = None) -> Dict[str, Optional[float]]:
     """
     Convenience function to calculate bundle pricing.
@@ -150,7 +152,7 @@ def calculate_bundle_pricing(products: List[ProductIn], custom_discounts: Option
     Returns:
         Dictionary with pricing information
     """
-    calculator = BundlePricingCalculator(custom_discounts)
+    calculator = BundlePricingCalculator(custom_discounts) if custom_discounts else _default_calculator
     return calculator.calculate_bundle_pricing(products)
 
 
@@ -165,8 +167,8 @@ def apply_pricing_to_bundle(bundle_data: BundleCreate, pricing_info: Dict[str, O
     Returns:
         Updated BundleCreate object with pricing information
     """
-    # Create a dict from the bundle data and update it with pricing
-    bundle_dict = bundle_data.model_dump()
-    bundle_dict.update(pricing_info)
-    
-    return BundleCreate(**bundle_dict)
\ No newline at end of file
+    # Shallow copy with the pricing patched in, rather than dumping and re-validating the
+    # whole bundle (products included). Keys that aren't BundleCreate fields are dropped,
+    # as constructing the model would have done.
+    fields = BundleCreate.model_fields
+    return bundle_data.model_copy(update={k: v for k, v in pricing_info.items() if k in fields})
\ No newline at end of file
@@ -10,11 +10,14 @@ import requests
 import logging
 import time
 import uuid
+from functools import lru_cache
 from typing import Optional
 from pathlib import Path
 
 import boto3
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import ClientError, NoCredentialsError
+from urllib3.util.retry import Retry
 
 # Load environment variables from .env file
 try:
@@ -34,6 +37,9 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Pooled connections kept per host, sized for the batch image concurrency
+HTTP_POOL_SIZE = 32
+
 def get_r2_config():
     """
     Get R2 configuration from environment variables.
@@ -56,26 +62,54 @@ class R2UploadError(Exception):
 
 def get_r2_client():
     """
-    Create and return S3-compatible client for CloudFlare R2.
+    Return the S3-compatible client for CloudFlare R2.
+    
+    The configuration is still read on every call, but a client (and its connection pool)
+    is only built when it changes, so uploads reuse open connections to R2.
     """
     config = get_r2_config()
     
     if not all([config['bucket_name'], config['endpoint_url'], config['access_key_id'], config['secret_access_key']]):
         raise R2UploadError("R2 credentials not configured. Check your .env file.")
     
+    return _r2_client(config['endpoint_url'], config['access_key_id'], config['secret_access_key'], config['region'])
+
+
+@lru_cache(maxsize=1)
+def _r2_client(endpoint_url: str, access_key_id: str, secret_access_key: str, region: str):
+    # boto3 clients are thread-safe, so uploads from every worker thread share this one
     try:
-        client = boto3.client(
+        return boto3.client(
             's3',
-            endpoint_url=config['endpoint_url'],
-            aws_access_key_id=config['access_key_id'],
-            aws_secret_access_key=config['secret_access_key'],
-            region_name=config['region']
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            region_name=region,
+            config=BotoConfig(
+                max_pool_connections=HTTP_POOL_SIZE,
+                retries={'mode': 'adaptive', 'max_attempts': 5},
+                tcp_keepalive=True,
+            ),
         )
-        return client
     except Exception as e:
         raise R2UploadError(f"Failed to create R2 client: {e}")
 
 
+# Transient download failures (resets, throttling, 5xx) are retried with exponential backoff
+# plus random jitter, so a blip doesn't turn into a proxy-URL fallback
+_DOWNLOAD_RETRY = Retry(
+    total=5,
+    backoff_factor=0.2,
+    backoff_jitter=1.0,
+    status_forcelist=(429, 500, 502, 503, 504),
+)
+
+# Keep-alive connections to the image server for the downloads, shared across uploads
+_http = requests.Session()
+_http.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=HTTP_POOL_SIZE, max_retries=_DOWNLOAD_RETRY))
+_http.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=HTTP_POOL_SIZE, max_retries=_DOWNLOAD_RETRY))
+
+
 def upload_image_to_r2(local_image_url: str, bundle_id: int) -> Optional[str]:
     """
     Upload image from local server to CloudFlare R2 and return public URL.
@@ -97,14 +131,6 @@ def upload_image_to_r2(local_image_url: str, bundle_id: int) -> Optional[str]:
         logger.info(f"  PUBLIC_DOMAIN: {config['public_domain']}")
         logger.info(f"  ENDPOINT_URL: {config['endpoint_url']}")
         
-        # Download image from local server
-        logger.info(f"Downloading image for bundle {bundle_id}: {local_image_url}")
-        response = requests.get(local_image_url, timeout=30)
-        response.raise_for_status()
-        
-        image_data = response.content
-        file_size = len(image_data)
-        
         # Generate unique filename
         original_filename = local_image_url.split('/')[-1]
         timestamp = int(time.time())
@@ -116,21 +142,30 @@ def upload_image_to_r2(local_image_url: str, bundle_id: int) -> Optional[str]:
         # Get R2 client
         r2_client = get_r2_client()
         
-        # Upload to R2
-        logger.info(f"Uploading {file_size} bytes to R2: {s3_key}")
-        r2_client.put_object(
-            Bucket=config['bucket_name'],
-            Key=s3_key,
-            Body=image_data,
-            ContentType='image/png',
-            ContentDisposition=f'inline; filename="{unique_filename}"',
-            CacheControl='public, max-age=31536000',  # Cache for 1 year
-            Metadata={
-                'bundle_id': str(bundle_id),
-                'original_filename': original_filename,
-                'upload_timestamp': str(timestamp)
-            }
-        )
+        # Pipe the download straight into the upload rather than through a temp file. boto3
+        # reads a non-seekable stream into memory up to the multipart threshold (8MB) before
+        # sending, so a typical PNG is still buffered whole (once); only larger images go out
+        # as parts while the download continues.
+        logger.info(f"Streaming image for bundle {bundle_id} to R2: {local_image_url} -> {s3_key}")
+        with _http.get(local_image_url, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            file_size = response.headers.get("Content-Length", "unknown")
+            response.raw.decode_content = True
+            r2_client.upload_fileobj(
+                response.raw,
+                config['bucket_name'],
+                s3_key,
+                ExtraArgs={
+                    'ContentType': 'image/png',
+                    'ContentDisposition': f'inline; filename="{unique_filename}"',
+                    'CacheControl': 'public, max-age=31536000',  # Cache for 1 year
+                    'Metadata': {
+                        'bundle_id': str(bundle_id),
+                        'original_filename': original_filename,
+                        'upload_timestamp': str(timestamp)
+                    }
+                }
+            )
         
         # Generate public URL - ALWAYS use configured domain if available
         if config['public_domain']:
@@ -1,57 +1,52 @@
+import asyncio
 from collections import defaultdict
-from datetime import datetime, timezone
+from datetime import datetime
 from typing import List, Dict, Any
 
-from dateutil import parser as date_parser
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from ..schemas.bundle import ProductIn, BundleCreate
 from ..utils.text import oxford_join
 from ..clients.inventory import fetch_products_for_store
 from .ai import maybe_enhance_bundle_text
-from ..repositories.bundles import bundle_exists_for_products
+from ..repositories.bundles import existing_bundle_signatures
+from ..utils.signatures import compute_signature_from_id_list
 from ..utils.text import parse_tags_str as __parse_tags
 
 
-def _safe_parse_dt(value) -> datetime | None:
-    if value is None:
-        return None
-    if isinstance(value, datetime):
-        return value
-    try:
-        return date_parser.parse(str(value))
-    except Exception:
-        return None
+def _product_ids(ps: List[ProductIn]) -> List[str]:
+    """Extract product IDs from a list of ProductIn objects."""
+    return [p.id for p in ps]
 
 
-def recommend_bundles(db: Session, store_id: str, num_bundles: int = 3) -> List[BundleCreate]:
-    products_raw = fetch_products_for_store(db, store_id)
-    
-    def product_ids_from_bundle(ps: List[ProductIn]) -> List[str]:
-        """Extract product IDs from a list of ProductIn objects."""
-        return [p.id for p in ps]
-
+def _load_products(db: Session, store_id: str) -> List[ProductIn]:
     # Normalize into ProductIn
     products: List[ProductIn] = []
-    for p in products_raw:
-        expires_on = _safe_parse_dt(p.get("expiresOn"))
-        # Treat -infinity or missing as far future so they don't crowd expiring items
-        if expires_on is None or (isinstance(expires_on, datetime) and expires_on.year < 1900):
-            expires_on = datetime(9999, 1, 1, tzinfo=timezone.utc)
+    for p in fetch_products_for_store(db, store_id):
+        # expires_on is already parsed; -infinity or missing is far future so it doesn't crowd expiring items
         product = ProductIn(
-            id=str(p.get("id")),
-            name=p.get("name") or "Unnamed",
-            product_type=p.get("productType") or None,
-            expires_on=expires_on,
-            stock=int(p.get("stock") or 0),
-            tags=__parse_tags(p.get("tags")),
-            price=float(p.get("price") or 0.0),
-            original_price=float(p.get("originalPrice") or 0.0),
+            id=p.id,
+            name=p.name or "Unnamed",
+            product_type=p.product_type or None,
+            expires_on=p.expires_on,
+            stock=p.stock,
+            tags=__parse_tags(p.tags),
+            price=p.price,
+            original_price=p.original_price,
         )
         products.append(product)
+    return products
+
 
+def _plan_bundles(db: Session, store_id: str, num_bundles: int):
+    """Load the store's products and pick the bundle groups (blocking DB + CPU work).
+
+    Returns (picks, buckets, existing), or None when the store has no products.
+    """
+    products = _load_products(db, store_id)
     if not products:
-        return []
+        return None
 
     # Group by product_type (fallback to 'Misc')
     buckets: Dict[str, List[ProductIn]] = defaultdict(list)
@@ -69,68 +64,101 @@ def recommend_bundles(db: Session, store_id: str, num_bundles: int = 3) -> List[
         key=lambda kv: (kv[1][0].expires_on or datetime.max),
     )
 
-    # Create up to num_bundles candidates
+    # Signatures already taken in this store; candidates are checked (and added) in memory
+    existing = existing_bundle_signatures(db, store_id)
+
+    # Pick up to num_bundles groups whose product set isn't saved yet
+    picks = _pick_new_groups(existing, ranked_groups, num_bundles)
+    return picks, buckets, existing
+
+
+async def recommend_bundles(db: Session, store_id: str, num_bundles: int = 3) -> List[BundleCreate]:
+    # The DB reads and the grouping/sorting run together in one threadpool hop, keeping the
+    # event loop free; only the AI text calls are awaited on the loop, concurrently
+    plan = await run_in_threadpool(_plan_bundles, db, store_id, num_bundles)
+    if plan is None:
+        return []
+    picks, buckets, existing = plan
+
+    # Optionally enhance with AI, all picks at once
+    enhanced_texts = await asyncio.gather(*(
+        maybe_enhance_bundle_text(name, [p.name for p in chosen], stock)
+        for name, _, chosen, stock in picks
+    ))
+
     bundles: List[BundleCreate] = []
+    for (name, description, chosen, stock), enhanced in zip(picks, enhanced_texts):
+        if enhanced:
+            name, description = enhanced
+        bundles.append(BundleCreate(
+            store_id=store_id,
+            name=name,
+            description=description,
+            products=chosen,
+            images=[],
+            stock=stock,
+        ))
+
+    # Top-up if fewer than requested
+    if len(bundles) < num_bundles:
+        bundles += await run_in_threadpool(_top_up_pairs, existing, store_id, buckets, num_bundles - len(bundles))
+
+    return bundles
+
+
+def _pick_new_groups(existing: set[str], ranked_groups, num_bundles: int) -> list[tuple]:
+    """Return (name, description, products, stock) for the first groups without an existing bundle."""
+    picks = []
     for group_name, items in ranked_groups[: max(num_bundles * 2, num_bundles)]:
         # Select top 2-3 items for the bundle, prefer those expiring soon
         chosen = items[:3] if len(items) >= 3 else items[:2] if len(items) >= 2 else items[:1]
         if len(chosen) < 2:
             # skip bundles with fewer than 2 items (can relax if needed)
             continue
-        stock = min([p.stock for p in chosen]) if chosen else 0
+        stock = min((p.stock for p in chosen), default=0)
 
         name = f"{group_name} Essentials Pack"
-        product_names = [p.name for p in chosen]
-        description = f"Includes {oxford_join(product_names)}."
+        description = f"Includes {oxford_join([p.name for p in chosen])}."
 
-        # Optionally enhance with AI
-        enhanced = maybe_enhance_bundle_text(name, product_names, stock)
-        if enhanced:
-            name, description = enhanced
+        # Check if bundle with these products already exists
+        signature = compute_signature_from_id_list(_product_ids(chosen))
+        if signature not in existing:
+            existing.add(signature)
+            picks.append((name, description, chosen, stock))
 
-        candidate = BundleCreate(
+        if len(picks) >= num_bundles:
+            break
+    return picks
+
+
+def _top_up_pairs(existing: set[str], store_id: str, buckets: Dict[str, List[ProductIn]], needed: int) -> List[BundleCreate]:
+    """Fill up with "Quick Saver" pairs of the soonest-expiring products."""
+    bundles: List[BundleCreate] = []
+    pool = [p for items in buckets.values() for p in items]
+    pool = sorted(pool, key=lambda x: (x.expires_on or datetime.max, x.stock))
+    i = 0
+    while len(bundles) < needed and i + 1 < len(pool):
+        chosen = [pool[i], pool[i+1]]
+        signature = compute_signature_from_id_list(_product_ids(chosen))
+        
+        # Skip if bundle with these products already exists
+        if signature in existing:
+            i += 2
+            continue
+        existing.add(signature)
+            
+        stock = min((p.stock for p in chosen), default=0)
+        name = f"Quick Saver Pack"
+        product_names = [p.name for p in chosen]
+        description = f"Includes {oxford_join(product_names)}."
+        bundles.append(BundleCreate(
             store_id=store_id,
             name=name,
             description=description,
             products=chosen,
             images=[],
             stock=stock,
-        )
-        
-        # Check if bundle with these products already exists
-        product_ids = product_ids_from_bundle(candidate.products)
-        if not bundle_exists_for_products(db, store_id, product_ids):
-            bundles.append(candidate)
-            
-        if len(bundles) >= num_bundles:
-            break
-
-    # Top-up if fewer than requested
-    if len(bundles) < num_bundles:
-        pool = [p for items in buckets.values() for p in items]
-        pool = sorted(pool, key=lambda x: (x.expires_on or datetime.max, x.stock))
-        i = 0
-        while len(bundles) < num_bundles and i + 1 < len(pool):
-            chosen = [pool[i], pool[i+1]]
-            product_ids = product_ids_from_bundle(chosen)
-            
-            # Skip if bundle with these products already exists
-            if bundle_exists_for_products(db, store_id, product_ids):
-                i += 2
-                continue
-                
-            stock = min([p.stock for p in chosen]) if chosen else 0
-            name = f"Quick Saver Pack"
-            product_names = [p.name for p in chosen]
-            description = f"Includes {oxford_join(product_names)}."
-            bundles.append(BundleCreate(
-                store_id=store_id,
-                name=name,
-                description=description,
-                products=chosen,
-                images=[],
-                stock=stock,
-            ))
-            i += 2
+        ))
+        i += 2
 
     return bundles
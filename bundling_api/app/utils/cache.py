@@ -0,0 +1,87 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Small thread-safe in-process LRU cache whose entries expire after ``ttl`` seconds.
+
+    Keys are tuples whose first element is a scope (e.g. a store id) so that all
+    entries of one scope can be dropped together with ``invalidate``. A ``ttl``
+    of 0 disables caching.
+
+    With ``maxweight``, the summed ``weigh(value)`` of all entries (e.g. their byte
+    size) is also kept under that budget; a value heavier than the whole budget is
+    not cached.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        maxsize: int = 1024,
+        maxweight: Optional[int] = None,
+        weigh: Callable[[Any], int] = lambda value: 1,
+    ):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.maxweight = maxweight
+        self._weigh = weigh
+        self._weight = 0
+        self._data: Dict[Tuple[Hashable, ...], Tuple[float, Any, int]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[Hashable, ...], default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return default
+            # Move to the end so eviction drops the least recently used entry
+            self._data[key] = self._data.pop(key)
+            return value
+
+    def set(self, key: Tuple[Hashable, ...], value: Any) -> None:
+        if self.ttl <= 0:
+            return
+        weight = self._weigh(value) if self.maxweight is not None else 0
+        if self.maxweight is not None and weight > self.maxweight:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            if len(self._data) >= self.maxsize or (
+                self.maxweight is not None and self._weight + weight > self.maxweight
+            ):
+                self._evict(weight)
+            self._data[key] = (time.monotonic() + self.ttl, value, weight)
+            self._weight += weight
+
+    def invalidate(self, scope: Optional[Hashable] = None) -> None:
+        """Drop every entry whose key starts with ``scope``, or everything if it's None."""
+        with self._lock:
+            if scope is None:
+                self._data.clear()
+                self._weight = 0
+                return
+            for key in [k for k in self._data if k[0] == scope]:
+                self._remove(key)
+
+    def _remove(self, key: Tuple[Hashable, ...]) -> None:
+        self._weight -= self._data.pop(key)[2]
+
+    def _evict(self, incoming_weight: int) -> None:
+        now = time.monotonic()
+        for key in [k for k, (exp, _, _) in self._data.items() if exp <= now]:
+            self._remove(key)
+        # Still full: drop the least recently used (dicts keep insertion order)
+        while self._data and (
+            len(self._data) >= self.maxsize
+            or (self.maxweight is not None and self._weight + incoming_weight > self.maxweight)
+        ):
+            self._remove(next(iter(self._data)))
@@ -5,7 +5,7 @@ A signature is a deterministic hash computed from a canonicalized set of product
 This enables database-level uniqueness enforcement using unique indexes.
 """
 import hashlib
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Sequence
 
 
 def compute_bundle_signature(products: List[Dict[str, Any]]) -> str:
@@ -51,6 +51,29 @@ def compute_bundle_signature(products: List[Dict[str, Any]]) -> str:
     return signature
 
 
+def compute_signature_from_products(products: Sequence[Any]) -> str:
+    """
+    Compute a signature from product objects that expose an ``id`` attribute (e.g. ProductIn).
+    
+    Produces the same signature as compute_bundle_signature on the dumped products,
+    without having to dump them first.
+    
+    Args:
+        products: Sequence of product objects
+        
+    Returns:
+        A hex-encoded SHA-256 hash string representing the unique product set
+        
+    Raises:
+        ValueError: If the product list is empty
+    """
+    if not products:
+        raise ValueError("Cannot compute signature for empty product list")
+    
+    signature_input = '|'.join(sorted(str(p.id) for p in products))
+    return hashlib.sha256(signature_input.encode('utf-8')).hexdigest()
+
+
 def compute_signature_from_id_list(product_ids: List[str]) -> str:
     """
     Compute a signature directly from a list of product ID strings.
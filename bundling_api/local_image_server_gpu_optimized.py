@@ -12,7 +12,7 @@ import os
 import time
 import uuid
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 import json
 
 import torch
@@ -43,6 +43,10 @@ JOBS_DIR.mkdir(exist_ok=True)
 app = FastAPI(title="GPU-Optimized Async Image Generation API", version="1.5.0")
 pipeline: Optional[StableDiffusionPipeline] = None
 active_jobs: Dict[str, Dict] = {}
+# Set when a job finishes, so GET /job/{id}?wait=N can answer as soon as it does
+job_events: Dict[str, asyncio.Event] = {}
+# Upper bound on how long one status request may be held open
+MAX_JOB_WAIT = 30.0
 
 
 class ImageGenerationRequest(BaseModel):
@@ -63,6 +67,10 @@ class ImageGenerationResponse(BaseModel):
     error: Optional[str] = None
 
 
+class BatchImageGenerationRequest(BaseModel):
+    requests: List[ImageGenerationRequest]
+
+
 class QuickImageResponse(BaseModel):
     image_url: str
     generation_time: float
@@ -275,6 +283,21 @@ async def health_check():
     }
 
 
+async def run_job(job_id: str, request: ImageGenerationRequest):
+    """Run a queued job, then wake any status requests waiting on it"""
+    try:
+        await generate_image_async(job_id, request)
+    finally:
+        event = job_events.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+
+async def run_jobs(jobs: List[tuple]):
+    """Run the jobs of one batch request"""
+    await asyncio.gather(*(run_job(job_id, request) for job_id, request in jobs))
+
+
 @app.post("/generate-image-async", response_model=ImageGenerationResponse)
 async def generate_image_async_endpoint(request: ImageGenerationRequest, background_tasks: BackgroundTasks):
     """Start async image generation and return job ID"""
@@ -291,7 +314,8 @@ async def generate_image_async_endpoint(request: ImageGenerationRequest, backgro
     }
     
     # Start background generation
-    background_tasks.add_task(generate_image_async, job_id, request)
+    job_events[job_id] = asyncio.Event()
+    background_tasks.add_task(run_job, job_id, request)
     
     return ImageGenerationResponse(
         job_id=job_id,
@@ -299,13 +323,48 @@ async def generate_image_async_endpoint(request: ImageGenerationRequest, backgro
     )
 
 
+@app.post("/generate-images-async", response_model=List[ImageGenerationResponse])
+async def generate_images_async_endpoint(batch: BatchImageGenerationRequest, background_tasks: BackgroundTasks):
+    """Start several async image generations with one request; returns their job IDs in order"""
+    if pipeline is None:
+        raise HTTPException(status_code=503, detail="Model not loaded yet")
+    
+    jobs = []
+    for request in batch.requests:
+        job_id = str(uuid.uuid4())
+        active_jobs[job_id] = {
+            "status": "queued",
+            "prompt": request.prompt,
+            "created_at": time.time()
+        }
+        job_events[job_id] = asyncio.Event()
+        jobs.append((job_id, request))
+    
+    background_tasks.add_task(run_jobs, jobs)
+    
+    return [ImageGenerationResponse(job_id=job_id, status="queued") for job_id, _ in jobs]
+
+
 @app.get("/job/{job_id}", response_model=ImageGenerationResponse)
-async def get_job_status(job_id: str):
-    """Get status of an image generation job"""
+async def get_job_status(job_id: str, wait: float = 0):
+    """Get status of an image generation job.
+    
+    With wait > 0 the request is held until the job finishes or that many seconds pass
+    (at most MAX_JOB_WAIT), so clients learn of completion without polling rapidly.
+    """
     if job_id not in active_jobs:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = active_jobs[job_id]
+    event = job_events.get(job_id)
+    if wait > 0 and event is not None:
+        try:
+            await asyncio.wait_for(event.wait(), timeout=min(wait, MAX_JOB_WAIT))
+        except asyncio.TimeoutError:
+            pass
+    
+    job = active_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
     return ImageGenerationResponse(
         job_id=job_id,
         status=job["status"],
@@ -0,0 +1,35 @@
+"""Add covering partial index for the active-products-per-store query
+
+Revision ID: 0006_products_active_cover
+Revises: 0005_add_image_url_column
+Create Date: 2025-09-24
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_products_active_cover'
+down_revision = '0005_add_image_url_column'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Serves fetch_products_for_store: the partial predicate matches its WHERE clause and
+    # INCLUDE carries the fixed-size selected columns. name and tags are left out (fetched
+    # from the heap) because an index tuple is capped at ~2.7KB, and a long tags value would
+    # make writes to the shared products table fail.
+    # CONCURRENTLY avoids locking the shared products table, and can't run in a transaction.
+    with op.get_context().autocommit_block():
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_active_cover '
+            'ON products ("storeId") '
+            'INCLUDE (id, "productType", "expiresOn", stock, price, "originalPrice") '
+            'WHERE "isActive" IS NOT FALSE'
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS idx_products_active_cover')
@@ -0,0 +1,55 @@
+"""Store bundle image bytes once per distinct content
+
+Revision ID: 0007_image_blobs
+Revises: 0006_products_active_cover
+Create Date: 2025-10-15
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_image_blobs'
+down_revision = '0006_products_active_cover'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'image_blobs',
+        sa.Column('sha256', sa.String(64), primary_key=True),
+        sa.Column('image_data', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now()),
+    )
+    # bundle_images is created by create_image_tables(), so older databases may not have it
+    if not sa.inspect(op.get_bind()).has_table('bundle_images'):
+        return
+    # Move the bytes into image_blobs (one copy per distinct image) and keep only the digest
+    op.add_column('bundle_images', sa.Column('sha256', sa.String(64), nullable=True))
+    op.execute("UPDATE bundle_images SET sha256 = encode(sha256(image_data), 'hex')")
+    op.execute(
+        'INSERT INTO image_blobs (sha256, image_data) '
+        'SELECT DISTINCT ON (sha256) sha256, image_data FROM bundle_images'
+    )
+    op.alter_column('bundle_images', 'sha256', nullable=False)
+    op.create_foreign_key(
+        'fk_bundle_images_sha256', 'bundle_images', 'image_blobs', ['sha256'], ['sha256']
+    )
+    op.create_index('ix_bundle_images_sha256', 'bundle_images', ['sha256'])
+    op.drop_column('bundle_images', 'image_data')
+
+
+def downgrade():
+    if sa.inspect(op.get_bind()).has_table('bundle_images'):
+        op.add_column('bundle_images', sa.Column('image_data', sa.LargeBinary(), nullable=True))
+        op.execute(
+            'UPDATE bundle_images SET image_data = b.image_data '
+            'FROM image_blobs b WHERE b.sha256 = bundle_images.sha256'
+        )
+        op.alter_column('bundle_images', 'image_data', nullable=False)
+        op.drop_index('ix_bundle_images_sha256', table_name='bundle_images')
+        op.drop_constraint('fk_bundle_images_sha256', 'bundle_images', type_='foreignkey')
+        op.drop_column('bundle_images', 'sha256')
+    op.drop_table('image_blobs')
@@ -0,0 +1,42 @@
+"""Add covering index for bundle image metadata lookups
+
+Revision ID: 0008_bundle_images_meta
+Revises: 0007_image_blobs
+Create Date: 2025-10-15
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_bundle_images_meta'
+down_revision = '0007_image_blobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # bundle_images is created by create_image_tables(), so older databases may not have it
+    if not sa.inspect(op.get_bind()).has_table('bundle_images'):
+        return
+    # Serves get_bundle_image_meta (ETag / 304 checks) with an index-only scan, and replaces
+    # the plain bundle_id index, which it covers as its leading column
+    with op.get_context().autocommit_block():
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_bundle_images_bundle_meta '
+            'ON bundle_images (bundle_id, id DESC) '
+            'INCLUDE (sha256, file_size, content_type)'
+        )
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_bundle_images_bundle_id')
+
+
+def downgrade():
+    if not sa.inspect(op.get_bind()).has_table('bundle_images'):
+        return
+    with op.get_context().autocommit_block():
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_bundle_images_bundle_id '
+            'ON bundle_images (bundle_id)'
+        )
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_bundle_images_bundle_meta')
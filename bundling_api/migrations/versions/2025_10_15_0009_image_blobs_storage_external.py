@@ -0,0 +1,26 @@
+"""Store image bytes uncompressed in TOAST
+
+Revision ID: 0009_image_blobs_external
+Revises: 0008_bundle_images_meta
+Create Date: 2025-10-15
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0009_image_blobs_external'
+down_revision = '0008_bundle_images_meta'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # PNGs are already deflate-compressed, so the default EXTENDED storage only burns CPU
+    # trying pglz on every insert (and checking on every read). EXTERNAL still moves the
+    # bytes out of line. Applies to rows written from now on.
+    op.execute('ALTER TABLE image_blobs ALTER COLUMN image_data SET STORAGE EXTERNAL')
+
+
+def downgrade():
+    op.execute('ALTER TABLE image_blobs ALTER COLUMN image_data SET STORAGE EXTENDED')
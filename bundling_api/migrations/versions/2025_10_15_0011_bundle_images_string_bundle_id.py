@@ -0,0 +1,38 @@
+"""Key bundle images by the string bundle id
+
+Revision ID: 0011_bundle_images_str_id
+Revises: 0009_image_blobs_external
+Create Date: 2025-10-15
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011_bundle_images_str_id'
+down_revision = '0009_image_blobs_external'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # bundles.id is a UUID string, so an integer column could never hold a real bundle's id.
+    # Changing the type rewrites the table and rebuilds its indexes.
+    # bundle_images is created by create_image_tables(), so older databases may not have it
+    if not sa.inspect(op.get_bind()).has_table('bundle_images'):
+        return
+    op.alter_column(
+        'bundle_images', 'bundle_id',
+        type_=sa.String(), existing_type=sa.Integer(), existing_nullable=False,
+        postgresql_using='bundle_id::text',
+    )
+
+
+def downgrade():
+    if sa.inspect(op.get_bind()).has_table('bundle_images'):
+        op.alter_column(
+            'bundle_images', 'bundle_id',
+            type_=sa.Integer(), existing_type=sa.String(), existing_nullable=False,
+            postgresql_using='bundle_id::integer',
+        )
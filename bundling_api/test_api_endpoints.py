@@ -14,7 +14,7 @@ from typing import Dict, Any
 os.environ["USE_MOCK_IMAGES"] = "true"
 
 from app.main import app
-from app.db import get_db
+from app.db import SessionLocal
 from app.models.bundle import Bundle
 from app.schemas.bundle import ProductIn, BundleCreate
 from app.repositories.bundles import create_bundle
@@ -67,7 +67,7 @@ def test_single_bundle_image_generation():
     
     with TestClient(app) as client:
         # Get database session
-        db = next(get_db())
+        db = SessionLocal()
         
         try:
             # Create a test bundle
@@ -112,7 +112,7 @@ def test_batch_image_generation():
     print("-" * 50)
     
     with TestClient(app) as client:
-        db = next(get_db())
+        db = SessionLocal()
         
         try:
             # Create multiple test bundles without images
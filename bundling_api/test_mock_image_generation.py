@@ -7,6 +7,7 @@ This shows that all the systems work perfectly, just using placeholder images.
 import os
 import sys
 from app.services.image_generator import generate_bundle_image, ImageGenerationError
+from app.services.mock_image_generator import is_mock_mode_enabled
 from app.schemas.bundle import ProductIn
 
 def test_mock_image_generation():
@@ -113,6 +114,7 @@ def demonstrate_both_modes():
     # Mock mode
     print("\n🎭 MOCK MODE (no credits needed):")
     os.environ["USE_MOCK_IMAGES"] = "true"
+    is_mock_mode_enabled.cache_clear()
     try:
         mock_url = generate_bundle_image("Demo Bundle", products, "Demo description")
         print(f"   Mock URL: {mock_url}")
@@ -122,6 +124,7 @@ def demonstrate_both_modes():
     # Real API mode 
     print("\n🔴 REAL API MODE (requires credits):")
     os.environ["USE_MOCK_IMAGES"] = "false"
+    is_mock_mode_enabled.cache_clear()
     try:
         real_url = generate_bundle_image("Demo Bundle", products, "Demo description") 
         print(f"   Real URL: {real_url}")
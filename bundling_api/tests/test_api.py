@@ -8,3 +8,94 @@ def test_health():
     r = client.get("/health")
     assert r.status_code == 200
     assert r.json() == {"status": "ok"}
+
+
+def test_image_proxy_survives_app_restart(monkeypatch):
+    import httpx
+    from app.routers import images
+
+    async_client = httpx.AsyncClient
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=b"png"))
+    monkeypatch.setattr(httpx, "AsyncClient", lambda **kw: async_client(transport=transport, **kw))
+
+    # Shutdown closes the upstream client; the next lifespan must get a fresh one
+    for name in ("restart-a.png", "restart-b.png"):
+        with TestClient(app) as client:
+            assert client.get(f"/images/generated/{name}").status_code == 200
+
+
+def test_image_batch_skips_oversized_images(monkeypatch):
+    import httpx
+    from app.routers import images
+
+    async def chunks():
+        yield b"xxxx"
+        yield b"xxxx"
+
+    def handler(request):
+        if request.url.path.endswith("big-declared.png"):
+            return httpx.Response(200, content=b"x" * 8)
+        if request.url.path.endswith("big-chunked.png"):
+            return httpx.Response(200, content=chunks())  # no Content-Length
+        return httpx.Response(200, content=b"png")
+
+    async_client = httpx.AsyncClient
+    transport = httpx.MockTransport(handler)
+    monkeypatch.setattr(httpx, "AsyncClient", lambda **kw: async_client(transport=transport, **kw))
+    monkeypatch.setattr(images, "_CACHEABLE_MAX_BYTES", 4)
+
+    with TestClient(app) as client:
+        r = client.get("/images/generated-batch?names=small.png,big-declared.png,big-chunked.png")
+    assert r.status_code == 200
+    assert r.json() == {"small.png": "cG5n", "big-declared.png": None, "big-chunked.png": None}
+
+
+def test_ai_client_reopens_after_shutdown():
+    import asyncio
+    from app.services import ai
+
+    async def restart():
+        first = ai._get_client()
+        await ai.close_ai_client()
+        return first, ai._get_client()
+
+    first, second = asyncio.run(restart())
+    assert first.is_closed and not second.is_closed
+
+
+def test_bundle_image_served_by_uuid_with_etag(monkeypatch):
+    from types import SimpleNamespace
+    from app.db import get_db
+    from app.routers import bundles
+
+    bundle_id = "0190b7a2-5c1e-7d3f-8a2b-9c4d5e6f7a8b"
+    digest = "ab" * 32
+    monkeypatch.setattr(
+        bundles, "get_bundle_image_meta",
+        lambda requested, db: SimpleNamespace(sha256=digest, content_type="image/png") if requested == bundle_id else None,
+    )
+    monkeypatch.setattr(bundles, "get_image_data", lambda sha256, db: b"png")
+    app.dependency_overrides[get_db] = lambda: None
+    try:
+        client = TestClient(app)
+        r = client.get(f"/bundles/{bundle_id}/image", params={"v": digest[:16]})
+        assert r.status_code == 200 and r.content == b"png"
+        assert "immutable" in r.headers["cache-control"]
+        r = client.get(f"/bundles/{bundle_id}/image", headers={"If-None-Match": r.headers["etag"]})
+        assert r.status_code == 304
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+
+def test_requests_without_a_session_skip_the_threadpool(monkeypatch):
+    from app import db
+
+    hops = []
+
+    async def record(func, *args, **kwargs):
+        hops.append(func)
+        return func(*args, **kwargs)
+
+    monkeypatch.setattr(db, "run_in_threadpool", record)
+    assert TestClient(app).get("/health").status_code == 200
+    assert hops == []
@@ -9,14 +9,14 @@ These tests verify that:
 """
 import pytest
 from unittest.mock import MagicMock
-from sqlalchemy.exc import IntegrityError
 
 from app.utils.signatures import (
     compute_bundle_signature, 
     compute_signature_from_id_list, 
+    compute_signature_from_products,
     validate_signature
 )
-from app.repositories.bundles import create_bundle, bundle_exists_for_products
+from app.repositories.bundles import create_bundle, create_bundles_bulk, bundle_exists_for_products
 from app.schemas.bundle import BundleCreate, ProductIn
 from app.models.bundle import Bundle
 
@@ -35,6 +35,16 @@ class TestSignatureComputation:
         assert sig1 == sig2
         assert len(sig1) == 64  # SHA-256 hex digest
     
+    def test_compute_signature_from_products_matches_dumped(self):
+        """Test that hashing ProductIn ids gives the same signature as hashing their dumps."""
+        products = [
+            ProductIn(id="prod2", name="B", stock=1, price=2.0),
+            ProductIn(id="prod1", name="A", stock=1, price=1.0),
+        ]
+        
+        dumped = [p.model_dump(mode="json") for p in products]
+        assert compute_signature_from_products(products) == compute_bundle_signature(dumped)
+    
     def test_compute_signature_different_products(self):
         """Test that different product sets produce different signatures."""
         products1 = [{"id": "prod1"}, {"id": "prod2"}]
@@ -117,8 +127,8 @@ class TestBundleRepositoryDeduplication:
             name="Test Bundle",
             description="Test bundle description",
             products=[
-                ProductIn(id="prod1", name="Product 1", stock=10),
-                ProductIn(id="prod2", name="Product 2", stock=5),
+                ProductIn(id="prod1", name="Product 1", stock=10, price=3.0),
+                ProductIn(id="prod2", name="Product 2", stock=5, price=4.0),
             ],
             images=["img1.jpg"],
             stock=5
@@ -126,9 +136,7 @@ class TestBundleRepositoryDeduplication:
     
     def test_create_bundle_computes_signature(self, mock_db, sample_bundle_data):
         """Test that create_bundle computes and sets signature."""
-        mock_db.add = MagicMock()
-        mock_db.commit = MagicMock()
-        mock_db.refresh = MagicMock()
+        mock_db.scalars = MagicMock(side_effect=lambda stmt, rows: [Bundle(**r) for r in rows])
         
         bundle = create_bundle(mock_db, sample_bundle_data)
         
@@ -138,20 +146,15 @@ class TestBundleRepositoryDeduplication:
         assert validate_signature(bundle.signature)
     
     def test_create_bundle_duplicate_raises_error(self, mock_db, sample_bundle_data):
-        """Test that creating duplicate bundle raises ValueError."""
-        # Mock IntegrityError with unique constraint violation
-        integrity_error = IntegrityError("statement", "params", "orig")
-        integrity_error.orig = MagicMock()
-        integrity_error.orig.__str__ = lambda: "uq_bundle_store_signature"
-        
-        mock_db.add = MagicMock()
-        mock_db.commit = MagicMock(side_effect=integrity_error)
-        mock_db.rollback = MagicMock()
+        """Test that creating duplicate bundle raises ValueError without a rollback."""
+        # ON CONFLICT DO NOTHING returns no row for an existing signature
+        mock_db.scalars = MagicMock(return_value=[])
         
         with pytest.raises(ValueError, match="bundle with the same products already exists"):
             create_bundle(mock_db, sample_bundle_data)
         
-        mock_db.rollback.assert_called_once()
+        mock_db.scalars.assert_called_once()
+        mock_db.rollback.assert_not_called()
     
     def test_create_bundle_invalid_products(self, mock_db):
         """Test that bundle with invalid products raises ValueError."""
@@ -194,6 +197,49 @@ class TestBundleRepositoryDeduplication:
         result = bundle_exists_for_products(mock_db, "store123", ["prod1", "prod2"])
         assert result is False
     
+    def test_create_bundles_bulk_single_statement(self, mock_db):
+        """Test that bulk create inserts every bundle with one statement and keeps input order."""
+        bundles = [
+            BundleCreate(
+                store_id="store123",
+                name=f"Bundle {i}",
+                products=[
+                    ProductIn(id=f"prod{i}", name="A", stock=1, price=1.0),
+                    ProductIn(id=f"prod{i + 10}", name="B", stock=1, price=2.0),
+                ],
+            )
+            for i in range(3)
+        ]
+        mock_db.scalars = MagicMock(side_effect=lambda stmt, rows: [Bundle(**r) for r in reversed(rows)])
+        
+        saved = create_bundles_bulk(mock_db, bundles)
+        
+        mock_db.scalars.assert_called_once()
+        mock_db.commit.assert_called_once()
+        assert [b.name for b in saved] == ["Bundle 0", "Bundle 1", "Bundle 2"]
+    
+    def test_create_bundles_bulk_skips_duplicates(self, mock_db):
+        """Test that duplicates within a batch and conflicts in the DB are dropped, not raised."""
+        products = [
+            ProductIn(id="prod1", name="A", stock=1, price=1.0),
+            ProductIn(id="prod2", name="B", stock=1, price=2.0),
+        ]
+        bundles = [
+            BundleCreate(store_id="store123", name="First", products=products),
+            BundleCreate(store_id="store123", name="Same products", products=list(reversed(products))),
+            BundleCreate(store_id="store123", name="Existing", products=products[:1]),
+        ]
+        # Simulate ON CONFLICT DO NOTHING dropping the row that already exists in the DB
+        mock_db.scalars = MagicMock(
+            side_effect=lambda stmt, rows: [Bundle(**r) for r in rows if r["name"] != "Existing"]
+        )
+        
+        saved = create_bundles_bulk(mock_db, bundles)
+        
+        sent_rows = mock_db.scalars.call_args[0][1]
+        assert [r["name"] for r in sent_rows] == ["First", "Existing"]
+        assert [b.name for b in saved] == ["First"]
+    
     def test_bundle_exists_for_products_invalid_ids(self, mock_db):
         """Test bundle_exists_for_products handles invalid product IDs."""
         result = bundle_exists_for_products(mock_db, "store123", [])
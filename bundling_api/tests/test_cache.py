@@ -0,0 +1,14 @@
+from app.utils.cache import TTLCache
+
+
+def test_ttl_cache_byte_budget_evicts_least_recently_used():
+    cache = TTLCache(ttl=60, maxsize=10, maxweight=10, weigh=len)
+    cache.set(("a",), b"1234")
+    cache.set(("b",), b"1234")
+    cache.get(("a",))  # b is now the least recently used
+    cache.set(("c",), b"1234")
+    assert cache.get(("b",)) is None
+    assert cache.get(("a",)) == b"1234" and cache.get(("c",)) == b"1234"
+
+    cache.set(("big",), b"x" * 11)  # heavier than the whole budget: not cached
+    assert cache.get(("big",)) is None and cache.get(("a",)) == b"1234"
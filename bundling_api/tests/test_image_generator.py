@@ -0,0 +1,51 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.services import image_generator
+
+
+def _bundle(bundle_id, name="Bundle"):
+    return SimpleNamespace(id=bundle_id, name=name, description=None, products=[{"name": "Apple"}])
+
+
+def test_batch_deadline_excludes_time_queued_for_a_slot(monkeypatch):
+    async def generate(name, products, description):
+        await asyncio.sleep(1.0 if name == "slow" else 0.1)
+        return "/api/images/generated/x.png"
+
+    monkeypatch.setattr(image_generator, "generate_bundle_image", generate)
+    monkeypatch.setattr(image_generator, "BUNDLE_IMAGE_TIMEOUT", 0.3)
+
+    # One slot: the last bundles wait longer than the timeout before they start
+    bundles = [_bundle(str(i)) for i in range(5)] + [_bundle("slow", "slow")]
+    results = asyncio.run(image_generator.generate_images_for_bundles_async(bundles, max_concurrent=1))
+
+    assert results.pop("slow") is None
+    assert all(url == "/api/images/generated/x.png" for url in results.values())
+
+
+def test_short_batch_response_falls_back_to_single_submissions(monkeypatch):
+    import httpx
+
+    paths = []
+
+    def handler(request):
+        paths.append(request.url.path)
+        if request.url.path == "/generate-images-async":
+            return httpx.Response(200, json=[{"job_id": "only-one", "status": "queued"}])
+        if request.url.path == "/generate-image-async":
+            return httpx.Response(200, json={"job_id": "single"})
+        return httpx.Response(404)
+
+    async def submit_all():
+        image_generator._submitters.clear()
+        client = httpx.AsyncClient(base_url="http://image", transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(image_generator, "get_client", lambda: client)
+        monkeypatch.setattr(image_generator, "get_settings", lambda: SimpleNamespace(local_image_api_url="http://image"))
+        async with client:
+            return await asyncio.wait_for(
+                asyncio.gather(*(image_generator._submit_job(f"prompt {i}") for i in range(3))), 5
+            )
+
+    assert asyncio.run(submit_all()) == ["single"] * 3
+    assert paths.count("/generate-images-async") == 1
@@ -0,0 +1,37 @@
+import pytest
+
+from app.schemas.bundle import ProductIn
+from app.services.pricing import BundlePricingCalculator, calculate_bundle_pricing
+
+
+def _products(*prices):
+    return [ProductIn(id=str(i), name=f"Product {i}", stock=1, price=price) for i, price in enumerate(prices)]
+
+
+@pytest.mark.parametrize(
+    "total, discount, expected",
+    [
+        (100.0, 15.0, 85.0),
+        (10.01, 5.0, 9.51),   # 9.5095 rounds half up
+        (0.1, 5.0, 0.1),      # 0.095 rounds half up
+        (19.99, 12.5, 17.49), # 17.49125 rounds down
+    ],
+)
+def test_discounted_price_rounds_half_up_to_the_cent(total, discount, expected):
+    assert BundlePricingCalculator().calculate_discounted_price(total, discount) == expected
+
+
+def test_float_noise_in_the_total_is_priced_as_whole_cents():
+    # sum() gives 1300.9499999999998; the bundle is worth 1300.95, and 10% off that is
+    # 1170.855, which rounds half up to 1170.86
+    pricing = calculate_bundle_pricing(_products(223.64, 324.19, 753.12))
+
+    assert pricing["discount_percentage"] == 10.0
+    assert pricing["discounted_price"] == 1170.86
+    assert pricing["savings_amount"] == 130.09
+
+
+def test_savings_is_the_difference_in_cents():
+    calculator = BundlePricingCalculator()
+    assert calculator.calculate_savings_amount(0.3, 0.1) == 0.2
+    assert calculator.calculate_savings_amount(1300.9499999999998, 1170.86) == 130.09